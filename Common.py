@@ -304,20 +304,24 @@ import glob
 import time,datetime
 from datetime import timedelta
 import codecs
-import numpy
 import random
 import shutil
-import pdfkit
 import string
 import fileinput
 import difflib
+import heapq
+import csv
+import tempfile
 import hashlib
-import pandas
+import pickle
+import threading
+import jinja2
+from jinja2 import meta as jinja2_meta
 import sys,select
+import ctypes,ctypes.util
 import subprocess
-import pyscreenshot as pyscreenshot
-from pyvirtualdisplay import Display
-from selenium.webdriver.common.keys import Keys
+import importlib
+import importlib.util
 try:
     from sets import Set
 except:
@@ -334,9 +338,60 @@ from email.utils import COMMASPACE, formatdate
 
 
 
+class LazyModule(object):
+    """ A module that is imported at its first attribute access
+
+    Heavy optional modules are loaded this way so a suite only pays for the
+    modules used by its keywords. The import error, if any, is raised when the
+    module is used the first time.
+    """
+    def __init__(self,name):
+        self._name      = name
+        self._module    = None
+
+    def __getattr__(self,attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module,attr)
+
+
+numpy           = LazyModule('numpy')
+pandas          = LazyModule('pandas')
+pdfkit          = LazyModule('pdfkit')
+pyscreenshot    = LazyModule('pyscreenshot')
+pyvirtualdisplay = LazyModule('pyvirtualdisplay')
+pyarrow         = LazyModule('pyarrow')
+pyarrow_parquet = LazyModule('pyarrow.parquet')
+
+
+def _selenium_keys():
+    """ Returns the selenium ``Keys`` class
+
+    Loading ``selenium.webdriver.common.keys`` the normal way imports all of
+    the webdriver packages, so the file is loaded alone when selenium has not
+    been imported yet.
+    """
+    name = 'selenium.webdriver.common.keys'
+    if name in sys.modules: return sys.modules[name].Keys
+    try:
+        spec = importlib.util.find_spec('selenium')
+        path = os.path.join(os.path.dirname(spec.origin),'webdriver','common','keys.py')
+        spec = importlib.util.spec_from_file_location('_renat_selenium_keys',path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module.Keys
+    except Exception:
+        return importlib.import_module(name).Keys
+
+
+# use the C loader when it is available
+_yaml_loader = getattr(yaml,'CLoader',yaml.Loader)
+
 # make sure the yaml dictionary is in its order
 yaml.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
     lambda loader, node: OrderedDict(loader.construct_pairs(node)))
+yaml.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+    lambda loader, node: OrderedDict(loader.construct_pairs(node)),Loader=_yaml_loader)
 
 
 # filter all warning
@@ -425,14 +480,126 @@ if not os.path.exists(_config_path):
     _config_path = _folder + '/config/config.yaml'
 if not os.path.exists(_config_path):
     raise Exception("ERR: could not find global config.yaml")
-with open(_config_path) as f:
-    file_content = f.read()
-    GLOBAL.update(yaml.load(os.path.expandvars(file_content)))
 
-### copy config file from maser to tmp
-### overwrite the current files
 _tmp_folder = _folder + '/tmp/'
 # _tmp_folder = os.getcwd() + '/tmp/'
+# the snapshot is unpickled, so each user has its own one
+_snapshot_path = _tmp_folder + '/config.snapshot.%d' % os.getuid()
+_env_var_regex = re.compile(r'\$(\w+|\{[^}]*\})')
+
+
+def _read_config_file(path):
+    """ Returns the content of a config file, retrying when it is empty
+    """
+    with codecs.open(path,"r","utf-8") as f:
+        file_content = f.read()
+        retry = 0
+        if len(file_content) == 0 and retry < 3:
+            time.sleep(5)
+            BuiltIn().log_to_console("WARN: could not access file %s. Will retry" % os.path.basename(path))
+            file_content = f.read()
+            retry += 1
+        if retry == 3:
+            BuiltIn().log_to_console("ERROR: could not get global config correctly")
+    return file_content
+
+
+def _file_stat(path):
+    """ Returns the information of ``path`` that decides if the file is changed
+    """
+    stat = os.stat(path)
+    return (path,stat.st_mtime_ns,stat.st_size)
+
+
+def _load_snapshot():
+    """ Returns the global config saved in the snapshot or ``None`` if the
+    snapshot is outdated
+
+    The snapshot is valid when the config files and the environment variables
+    used by them are the same as when it was made. A snapshot that is not
+    owned by the current user or is writable by others is ignored.
+    """
+    try:
+        with open(_snapshot_path,'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_uid != os.getuid() or stat.st_mode & 0o022: return None
+            snapshot = pickle.load(f)
+        if snapshot['version'] != ROBOT_LIBRARY_VERSION: return None
+        if snapshot['file'][0][0] != _config_path: return None
+        for info in snapshot['file']:
+            if _file_stat(info[0]) != info: return None
+        for name,value in snapshot['env'].items():
+            if os.environ.get(name) != value: return None
+        return snapshot['config']
+    except Exception:
+        return None
+
+
+def _save_snapshot(file_list,env_list,config):
+    """ Saves the parsed global config to the snapshot
+    """
+    snapshot = {
+        'version':  ROBOT_LIBRARY_VERSION,
+        'file':     [_file_stat(path) for path in file_list],
+        'env':      dict((name,os.environ.get(name)) for name in env_list),
+        'config':   config}
+    tmp_path = '%s.%d' % (_snapshot_path,os.getpid())
+    try:
+        # readable by the owner only, never follows an existing file
+        fd = os.open(tmp_path,os.O_WRONLY|os.O_CREAT|os.O_EXCL,0o600)
+        with os.fdopen(fd,'wb') as f:
+            pickle.dump(snapshot,f,pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path,_snapshot_path)
+    except Exception:
+        # the snapshot is only a cache, parse the files again next time
+        pass
+
+
+def _load_global_config():
+    """ Returns the global config from ``config.yaml`` and ``auth.yaml``,
+    ``device.yaml``, ``template.yaml`` in the master folder
+
+    The parsed config is cached in a snapshot and only parsed again when any
+    of the files or the environment variables used by them are changed.
+    """
+    config = _load_snapshot()
+    if config is not None: return config
+
+    config = {}
+    file_list = [_config_path]
+    env_list = set()
+    file_content = _read_config_file(_config_path)
+    env_list.update(_env_var_regex.findall(file_content))
+    config.update(yaml.load(os.path.expandvars(file_content),Loader=_yaml_loader))
+    ### expand environment variable and update GLOBAL config
+    for entry in ['auth.yaml', 'device.yaml','template.yaml']:
+        path = config['default']['renat-master-folder'] + '/' + entry
+        file_list.append(path)
+        file_content = _read_config_file(path)
+        env_list.update(_env_var_regex.findall(file_content))
+        config.update(yaml.load(os.path.expandvars(file_content),Loader=_yaml_loader))
+
+    _save_snapshot(file_list,[item.strip('{}') for item in env_list],config)
+    return config
+
+
+def _copy_master(pattern,dst):
+    """ Copies the newest file matched ``pattern`` to ``dst`` unless ``dst``
+    is the same file already
+    """
+    newest = max(glob.iglob(pattern))
+    if os.path.exists(dst):
+        src_stat = os.stat(newest)
+        dst_stat = os.stat(dst)
+        if src_stat.st_mtime == dst_stat.st_mtime and src_stat.st_size == dst_stat.st_size:
+            return
+    shutil.copy2(newest,dst)
+
+
+GLOBAL.update(_load_global_config())
+
+### copy config file from maser to tmp
+### overwrite the current files
 _renat_master_folder    = GLOBAL['default']['renat-master-folder']
 
 #lock_file = _renat_master_folder + '/tmp.lock'
@@ -449,30 +616,13 @@ _renat_master_folder    = GLOBAL['default']['renat-master-folder']
 
 _calient_master_path    = GLOBAL['default']['calient-master-path']
 if _calient_master_path:
-    newest_calient = max(glob.iglob(_calient_master_path))
-    shutil.copy2(newest_calient,_tmp_folder + "/calient.xlsm")
+    _copy_master(_calient_master_path,_tmp_folder + "/calient.xlsm")
 
 _ntm_master_path        = GLOBAL['default']['ntm-master-path']
 # if _ntm_master_path:
 #    _ntm_master_path = os.path.expandvars(_ntm_master_path)
 if _ntm_master_path:
-    newest_ntm = max(glob.iglob(_ntm_master_path))
-    shutil.copy2(newest_ntm,_tmp_folder + "/g4ntm.xlsm")
-
-
-### expand environment variable and update GLOBAL config
-for entry in ['auth.yaml', 'device.yaml','template.yaml']:
-    with codecs.open(_renat_master_folder + '/' + entry,"r","utf-8") as f:
-        file_content = f.read()
-        retry = 0
-        if len(file_content) == 0 and retry < 3:
-            time.sleep(5)
-            BuiltIn().log_to_console("WARN: could not access file %s. Will retry" % entry)
-            file_content = f.read()
-            retry += 1
-        if retry == 3:
-            BuiltIn().log_to_console("ERROR: could not get global config correctly")
-        GLOBAL.update(yaml.load(os.path.expandvars(file_content)))
+    _copy_master(_ntm_master_path,_tmp_folder + "/g4ntm.xlsm")
 
 
 ### local setting
@@ -491,7 +641,7 @@ if local_config_path == '':
     BuiltIn().log_to_console("WARN: Could not find the local config file")
 else:
     with open(local_config_path) as f:
-        LOCAL.update(yaml.load(f))
+        LOCAL.update(yaml.load(f,Loader=_yaml_loader))
     BuiltIn().log_to_console("Current local.yaml: " + local_config_path)
 
 USER = os.path.expandvars("$USER")
@@ -598,15 +748,165 @@ def version():
     return ROBOT_LIBRARY_VERSION
 
 
+### tag index
+_tag_index = None
+_tag_token_regex = re.compile(r'\(|\)|[^\s()]+')
+_tag_operators = ('AND','OR','NOT','(',')')
+
+def _get_tag_index():
+    """ Returns the tag index of current ``node`` and ``webapp`` in LOCAL
+
+    For each kind, the index holds the items in their order, the items that
+    have a ``tag`` key and a frozenset of items for each tag. The index is
+    rebuilt when the items of ``node`` or ``webapp`` are changed (e.g. a dead
+    node was removed) or after `Reset Tag Index`.
+    """
+    global _tag_index
+    nodes   = LOCAL.get('node') or {}
+    webapps = LOCAL.get('webapp') or {}
+    key = (id(nodes),tuple(nodes),id(webapps),tuple(webapps))
+    if _tag_index is not None and _tag_index['key'] == key: return _tag_index
+
+    index = {'key':key,'attr':{}}
+    for kind,items in (('node',nodes),('webapp',webapps)):
+        tag_map = {}
+        tagged  = []
+        for name in items:
+            if 'tag' not in items[name]: continue
+            tagged.append(name)
+            for tag in items[name]['tag'] or []:
+                tag_map.setdefault(tag,set()).add(name)
+        index[kind] = {
+            'order':    dict((name,i) for i,name in enumerate(items)),
+            'tagged':   frozenset(tagged),
+            'tag':      dict((tag,frozenset(names)) for tag,names in tag_map.items())}
+    _tag_index = index
+    return index
+
+
+def reset_tag_index():
+    """ Clears the tag index used by `Node With Tag`, `Node Without Tag` and
+    `Node With Attr`
+
+    The index follows the adding and removing of nodes automatically. This
+    keyword is only necessary after the ``tag`` or other attributes of an
+    existed node in ``LOCAL`` have been changed.
+    """
+    global _tag_index
+    _tag_index = None
+
+
+def _parse_tag_expr(tokens,kind_index):
+    """ Returns the set of items matched the tag expression ``tokens``
+
+    ``OR`` has the lowest priority, then ``AND`` and ``NOT``. ``NOT`` at the
+    beginning of an expression means all tagged items except the followed one.
+    """
+    pos = [0]
+
+    def _peek():
+        return tokens[pos[0]] if pos[0] < len(tokens) else None
+
+    def _next():
+        token = _peek()
+        if token is None:
+            raise Exception("ERR: unexpected end of tag expression `%s`" % ' '.join(tokens))
+        pos[0] += 1
+        return token
+
+    def _atom():
+        token = _next()
+        if token == '(':
+            result = _or()
+            if _next() != ')':
+                raise Exception("ERR: missing `)` in tag expression `%s`" % ' '.join(tokens))
+            return result
+        if token in _tag_operators:
+            raise Exception("ERR: unexpected `%s` in tag expression `%s`" % (token,' '.join(tokens)))
+        return kind_index['tag'].get(token,frozenset())
+
+    def _not():
+        if _peek() == 'NOT':
+            _next()
+            result = kind_index['tagged'] - _atom()
+        else:
+            result = _atom()
+        while _peek() == 'NOT':
+            _next()
+            result = result - _atom()
+        return result
+
+    def _and():
+        result = _not()
+        while _peek() == 'AND':
+            _next()
+            result = result & _not()
+        return result
+
+    def _or():
+        result = _and()
+        while _peek() == 'OR':
+            _next()
+            result = result | _and()
+        return result
+
+    result = _or()
+    if _peek() is not None:
+        raise Exception("ERR: unexpected `%s` in tag expression `%s`" % (_peek(),' '.join(tokens)))
+    return result
+
+
+def _match_tag(tag,kind_index):
+    """ Returns the set of items matched ``tag`` which is a tag name or a tag
+    expression
+
+    A defined tag name is always matched literally. ``tag`` is also matched
+    literally when it could not be parsed as a tag expression.
+    """
+    if tag in kind_index['tag']:
+        return kind_index['tag'][tag]
+    tokens = _tag_token_regex.findall(tag)
+    if any(token in _tag_operators for token in tokens):
+        try:
+            return _parse_tag_expr(tokens,kind_index)
+        except Exception as err:
+            BuiltIn().log("    `%s` is used as a tag name (%s)" % (tag,err))
+    return kind_index['tag'].get(tag,frozenset())
+
+
+def _sorted_items(items,kind_index):
+    """ Returns ``items`` in the order of ``local.yaml``
+    """
+    return sorted(items,key=lambda name: kind_index['order'][name])
+
+
 def node_with_attr(attr_name,value):
     """ Returns a list of nodes which have attribute ``attr_name`` with value ``value``
     """
-    result = [ node for node in NODE if attr_name in NODE[node] and NODE[node][attr_name] == value ]
+    index = _get_tag_index()
+    nodes = LOCAL.get('node') or {}
+    attr_index = index['attr'].get(attr_name)
+    if attr_index is None:
+        # nodes with unhashable values are kept in a list and checked one by one
+        attr_index = {'value':{},'other':[]}
+        for node in nodes:
+            if attr_name not in nodes[node]: continue
+            try:
+                attr_index['value'].setdefault(nodes[node][attr_name],[]).append(node)
+            except TypeError:
+                attr_index['other'].append(node)
+        index['attr'][attr_name] = attr_index
+    try:
+        result = list(attr_index['value'].get(value,[]))
+    except TypeError:
+        result = []
+    result += [ node for node in attr_index['other'] if nodes[node][attr_name] == value ]
+    result = _sorted_items(result,index['node'])
     BuiltIn().log("Found %d nodes with condition `%s`=`%s`" % (len(result),attr_name,value))
     return result
 
 
-def node_with_tag(*tag_list):
+def node_with_tag(*tag_list,kind='node'):
     """ Returns list of ``node`` or ``webapp`` from ``local.yaml`` that has *ALL* tags defined by ``tag_list``
 
     Tag was defined like this in local.yaml
@@ -617,41 +917,32 @@ def node_with_tag(*tag_list):
 |            - tag1
 |            - tag2
 
+    Each item of ``tag_list`` could also be a tag expression using ``AND``,
+    ``OR``, ``NOT`` and parentheses. ``OR`` has the lowest priority, then
+    ``AND`` and ``NOT``. A leading ``NOT`` means all tagged nodes except the
+    followed ones. A tag name that is defined in ``local.yaml`` or could not
+    be parsed as an expression is matched literally.
+
+    By default only ``node`` items are returned. Use ``kind=webapp`` for
+    ``webapp`` items or ``kind=all`` for both.
+
     Examples:
     | ${test3}=  | Common.`Node With Tag`  |  tag1 |  tag3 |
+    | ${test4}=  | Common.`Node With Tag`  |  tag1 AND (tag2 OR tag3) NOT tag4 |
+    | ${test5}=  | Common.`Node With Tag`  |  NOT tag1 |
+    | ${test6}=  | Common.`Node With Tag`  |  tag1 |  kind=webapp |
     """
+    if kind not in ('node','webapp','all'):
+        raise Exception("ERR: `kind` should be `node`, `webapp` or `all`")
 
+    index   = _get_tag_index()
     result  = []
-
-    if sys.version_info[0] > 2:
-        s0 = set(tag_list)
-        if 'node' in LOCAL and LOCAL['node']:
-            for item in LOCAL['node']:
-                if 'tag' in LOCAL['node'][item]:
-                    if LOCAL['node'][item]['tag']:
-                        s1 = set(LOCAL['node'][item]['tag'])
-                    else:
-                        s1 = set()
-                    if s0.issubset(s1): result.append(item)
-        if 'webapp' in LOCAL and LOCAL['webapp']:
-            for item in LOCAL['webapp']:
-                if 'tag' in LOCAL['webapp'][item]:
-                    if LOCAL['webapp'][item]['tag']:
-                        s1 = set(LOCAL['webapp'][item]['tag'])
-                    else:
-                        s1 = set()
-    else:
-        s0 = Set(tag_list)
-        if 'node' in LOCAL and LOCAL['node']:
-            for item in LOCAL['node']:
-                if 'tag' in LOCAL['node'][item]:
-                    s1 = Set(LOCAL['node'][item]['tag'])
-                    if s0.issubset(s1): result.append(item)
-        if 'webapp' in LOCAL and LOCAL['webapp']:
-            for item in LOCAL['webapp']:
-                if 'tag' in LOCAL['webapp'][item]:
-                    s1 = Set(LOCAL['webapp'][item]['tag'])
-                    if s0.issubset(s1): result.append(item)
+    for item_kind in ('node','webapp') if kind == 'all' else (kind,):
+        kind_index  = index[item_kind]
+        items       = kind_index['tagged']
+        for tag in tag_list:
+            items = items & _match_tag(tag,kind_index)
+        result += _sorted_items(items,kind_index)
 
     BuiltIn().log("Found %d nodes have the tags(%s)" % (len(result),str(tag_list)))
     return result
@@ -667,32 +958,21 @@ def node_without_tag(*tag_list):
 |            - tag1
 |            - tag2
 
+    Items of ``tag_list`` could be tag expressions, see `Node With Tag`
+
     Examples:
     | ${test3}=  | Common.`Node Without Tag`  |  tag1 |  tag3 |
     """
 
-    result  = []
-    if sys.version_info[0] > 2:
-        s0 = set(tag_list)
-        if not LOCAL['node']: return result
-        for node in LOCAL['node']:
-            if 'tag' in LOCAL['node'][node]:
-                if LOCAL['node'][node]['tag']:
-                    s1 = set(LOCAL['node'][node]['tag'])
-                else:
-                    s1 = set()
-                if len(s0 & s1) == 0: result.append(node)
-            else:
-                BuiltIn().log("    Node `%s` has no `tag` key, check your `local.yaml`" % node)
-    else:
-        s0 = Set(tag_list)
-        if not LOCAL['node']: return result
-        for node in LOCAL['node']:
-            if 'tag' in LOCAL['node'][node]:
-                s1 = Set(LOCAL['node'][node]['tag'])
-                if len(s0 & s1) == 0: result.append(node)
-            else:
-                BuiltIn().log("    Node `%s` has no `tag` key, check your `local.yaml`" % node)
+    index       = _get_tag_index()
+    kind_index  = index['node']
+    for node in kind_index['order']:
+        if node not in kind_index['tagged']:
+            BuiltIn().log("    Node `%s` has no `tag` key, check your `local.yaml`" % node)
+    items = kind_index['tagged']
+    for tag in tag_list:
+        items = items - _match_tag(tag,kind_index)
+    result = _sorted_items(items,kind_index)
     BuiltIn().log("Found %d nodes do not include any tags(%s)" % (len(result),str(tag_list)))
     return result
 
@@ -728,7 +1008,8 @@ def mib_for_node(node):
 def loop_for_node_tag(var,tags,*keywords):
     """ Repeatly executes RF ``keyword`` for nodes that has tag ``tags``
 
-    multi tags are separated by `:`
+    multi tags are separated by `:`, each of them could be a tag expression
+    (see `Node With Tag`)
     keywords has same meaning with ``keywords`` used by `Run Keywords` of
     RobotFramework ( keyword and its arguments are separated by ``AND`` with the
     others.
@@ -780,6 +1061,208 @@ def str2seq(str_index,size):
     return None
 
 
+### columnar result store
+_store_enabled = None
+
+def _store_available():
+    """ Returns ``True`` if the result store could be used
+    """
+    global _store_enabled
+    if _store_enabled is None:
+        _store_enabled = importlib.util.find_spec('pyarrow') is not None
+        if not _store_enabled:
+            log("WARN: pyarrow is not available, result store is disabled")
+    return _store_enabled
+
+
+def _store_file(view):
+    """ Returns the path of ``view`` in the result store of current result folder
+    """
+    return '%s/.store/%s.parquet' % (get_result_path(),view)
+
+
+def _csv_stat(path):
+    """ Returns the size and modified time of ``path`` as bytes
+    """
+    stat = os.stat(path)
+    return ('%d:%d' % (stat.st_size,stat.st_mtime_ns)).encode('utf-8')
+
+
+def _to_header(header):
+    """ Converts ``header`` parameter of a keyword to the value used by pandas
+    """
+    if header is None or str(header).lower() in ['none','null','']: return None
+    return int(header)
+
+
+def _store_text_exact(src_file,data):
+    """ Returns ``True`` if ``data`` read from ``src_file`` gives the same
+    strings as reading ``src_file`` without header
+
+    A CSV file without header is read as strings, so `Read Result` uses the
+    store for it only when this is ``True``.
+    """
+    head = pandas.read_csv(src_file,header=None,nrows=1,dtype=str).iloc[0].tolist()
+    if head != [str(x) for x in data.columns]: return False
+    # numeric column names change the types of the columns read without header
+    if pandas.to_numeric(pandas.Series(head),errors='coerce').notna().any(): return False
+    raw  = pandas.read_csv(src_file,header=0,dtype=str)
+    text = data.astype(str).mask(data.isna())
+    if not raw.isna().equals(text.isna()): return False
+    return bool((raw.fillna('').values == text.fillna('').values).all())
+
+
+def store_result(src_file,view=None):
+    """ Stores CSV file ``src_file`` to the columnar result store of the
+    current result folder and returns the view name.
+
+    The store keeps each view as a Parquet file in ``.store`` of the result
+    folder. The keywords that read CSV files (`CSV Select`, `CSV To List`,
+    `Log CSV` and the tester keywords) read the stored view instead of parsing
+    the CSV file again, as long as the CSV file has not been changed or
+    removed. The 1st row of the file is used as the header.
+
+    Default view name is the file name without ``.csv``. When ``result-csv``
+    in ``default`` configuration is ``no``, the CSV file is removed after it
+    was stored. Use `Export Result` to get it back.
+
+    The keyword does nothing and returns ``None`` if ``pyarrow`` is not
+    installed or the file could not be stored.
+
+    Example:
+    | ${view}= | Common.`Store Result` | result/stat_Flow_Statistics.csv |
+    """
+    if not _store_available(): return None
+    if view is None: view = os.path.splitext(os.path.basename(src_file))[0]
+    store_file = _store_file(view)
+    try:
+        data    = pandas.read_csv(src_file,header=0)
+        table   = pyarrow.Table.from_pandas(data,preserve_index=False)
+        meta    = dict(table.schema.metadata or {})
+        meta[b'renat-source']   = os.path.abspath(src_file).encode('utf-8')
+        meta[b'renat-stat']     = _csv_stat(src_file)
+        meta[b'renat-text']     = b'1' if _store_text_exact(src_file,data) else b'0'
+        table   = table.replace_schema_metadata(meta)
+        if not os.path.exists(os.path.dirname(store_file)): os.makedirs(os.path.dirname(store_file))
+        # row groups let `Read Result` skip the rows out of the range
+        pyarrow_parquet.write_table(table,store_file + '.tmp',
+                        row_group_size=int(get_config_value('csv-chunk-size','default',100000)))
+        os.replace(store_file + '.tmp',store_file)
+    except Exception as err:
+        BuiltIn().log("WARN: could not store `%s`: %s" % (src_file,err))
+        return None
+
+    if not get_config_value('result-csv','default',True):
+        os.remove(src_file)
+    BuiltIn().log("Stored `%s` as view `%s`" % (src_file,view))
+    return view
+
+
+def _stored_view(src):
+    """ Returns the store file for ``src`` or ``None`` if ``src`` should be
+    read from the CSV file
+
+    ``src`` is a CSV file path or a view name.
+    """
+    if not _store_available(): return None
+    name,ext = os.path.splitext(os.path.basename(src))
+    store_file = _store_file(name)
+    if not os.path.exists(store_file): return None
+    # a view name
+    if os.sep not in src and ext.lower() != '.csv' and not os.path.exists(src): return store_file
+    meta = pyarrow_parquet.read_schema(store_file).metadata or {}
+    if meta.get(b'renat-source') != os.path.abspath(src).encode('utf-8'): return None
+    if not os.path.exists(src) or meta.get(b'renat-stat') == _csv_stat(src): return store_file
+    return None
+
+
+def read_result(src,header=0,columns=None,start=None,stop=None):
+    """ Returns the data of ``src`` as a pandas DataFrame
+
+    ``src`` is a CSV file path or a view name in the result store (see
+    `Store Result`). ``header`` is the row used as column names, ``${NULL}``
+    means there is no header row. ``columns`` is a list of column positions
+    that should be read, default is all columns.
+
+    ``start`` and ``stop`` limit the rows like a Python slice (``stop`` is not
+    included). Rows are counted from zero after the header row, or from the
+    1st line of the file when ``header`` is ``${NULL}``.
+
+    A stored view is memory mapped and only the necessary columns and row
+    groups are read.
+
+    Example:
+    | ${data}= | Common.`Read Result` | stat_Flow_Statistics |
+    | ${data}= | Common.`Read Result` | stat_Flow_Statistics | start=100 | stop=200 |
+    """
+    header      = _to_header(header)
+    store_file  = _stored_view(src)
+    if columns is not None: columns = [int(x) for x in columns]
+    start       = 0 if start is None else int(start)
+    stop        = None if stop is None else int(stop)
+
+    # the store keeps the 1st row as header, without header it is used when
+    # it gives the same strings as the CSV file
+    if store_file is not None and header is None and os.path.exists(src):
+        meta = pyarrow_parquet.read_schema(store_file).metadata or {}
+        if meta.get(b'renat-text') != b'1': store_file = None
+    if store_file is None or header not in (0,None):
+        # without header the 1st line is always read, so the types are the
+        # same as when the whole file is read
+        lead  = 1 if header is None and start > 0 else 0
+        first = 1 if header is None else header + 1
+        skip  = range(first,first + start - lead)
+        nrows = None if stop is None else max(stop - start,0) + lead
+        data  = pandas.read_csv(src,header=header,usecols=columns,skiprows=skip,nrows=nrows)
+        return data.iloc[lead:].reset_index(drop=True) if lead else data
+
+    pf = pyarrow_parquet.ParquetFile(store_file,memory_map=True)
+    names = pf.schema_arrow.names
+    if columns is not None: names = [names[i] for i in sorted(set(columns))]
+    # the header is the row 0 when it is read as data
+    shift = 1 if header is None else 0
+    total = pf.metadata.num_rows
+    first = min(max(start - shift,0),total)
+    last  = total if stop is None else min(max(stop - shift,first),total)
+    groups = []
+    offset = 0
+    base = 0
+    for i in range(pf.num_row_groups):
+        size = pf.metadata.row_group(i).num_rows
+        if offset + size > first and offset < last:
+            if not groups: base = offset
+            groups.append(i)
+        offset += size
+    if groups:
+        table = pf.read_row_groups(groups,columns=names).slice(first - base,last - first)
+    else:
+        table = pf.schema_arrow.empty_table().select(names)
+    data = table.to_pandas()
+
+    if header is None:
+        # values are strings like a CSV file without header
+        body = pandas.DataFrame(data.astype(str).mask(data.isna()).values)
+        if start <= 0 and (stop is None or stop > 0):
+            body = pandas.concat([pandas.DataFrame([names]),body],ignore_index=True)
+        if columns is not None: body.columns = sorted(set(columns))
+        data = body
+    return data
+
+
+def export_result(view,dst_file=None):
+    """ Exports stored ``view`` to CSV file ``dst_file`` and returns its path
+
+    Default ``dst_file`` is the view name with ``.csv`` in the result folder.
+
+    Example:
+    | Common.`Export Result` | stat_Flow_Statistics |
+    """
+    if dst_file is None: dst_file = '%s/%s.csv' % (get_result_path(),view)
+    pyarrow_parquet.read_table(_store_file(view),memory_map=True).to_pandas().to_csv(dst_file,index=None)
+    BuiltIn().log("Exported view `%s` to `%s`" % (view,dst_file))
+    return dst_file
+
+
 def csv_select(src_file,row=u':',col=u':',dst_file=None,flatten=False,header=None):
     """ Select part of the CSV file and write it to other file
 
@@ -804,9 +1287,18 @@ def csv_select(src_file,row=u':',col=u':',dst_file=None,flatten=False,header=Non
     | `CSV Select`  |    result/data05.csv |  0:5:2 |  :   |
 
     """
-    src_pd = pandas.read_csv(src_file,header=header)
+    # only the rows in the range are read
+    start,stop = None,None
+    rows = str2seq(row,0)
+    if rows is not None and len(rows) > 0 and min(rows) >= 0:
+        start,stop = min(rows),max(rows) + 1
+    src_pd = read_result(src_file,header=header,start=start,stop=stop)
     s = src_pd.shape
-    data = src_pd.iloc[str2seq(row,s[0]),str2seq(col,s[1])]
+    if start is None:
+        rows = str2seq(row,s[0])
+    else:
+        rows = [x - start for x in rows]
+    data = src_pd.iloc[rows,str2seq(col,s[1])]
     if dst_file:
         data.to_csv(dst_file,index=None,header=header)
         BuiltIn().log("Wrote to CSV file `%s`" % dst_file)
@@ -825,8 +1317,8 @@ def csv_to_list(filepath,col=u"0",header=None):
     Exmaple:
     | ${LIST}= | CSV To List | 100 |
     """
-    df = pandas.read_csv(filepath,header=header)
-    result = df.iloc[:,int(col)].values.tolist()
+    df = read_result(filepath,header=header,columns=[col])
+    result = df.iloc[:,0].values.tolist()
     BuiltIn().log("Return %d values from `%s`" % (len(result),filepath))
     return result
 
@@ -845,17 +1337,114 @@ def csv_concat(src_pattern, dst_name,input_header=None,result_header=True):
     if num < 1:
         BuiltIn().log("Could not find any file to concatinate")
         return False
-    file = file_list.pop(0)
-    pd   = pandas.read_csv(file,header=input_header)
+
+    # the result has all columns of the files in their appearance order
+    columns = []
+    for file in file_list:
+        for column in pandas.read_csv(file,header=input_header,nrows=1).columns:
+            if column not in columns: columns.append(column)
+
+    # stream the files chunk by chunk to the result
+    chunk_size = int(get_config_value('csv-chunk-size','default',100000))
+    first = True
     for file in file_list:
-        pd_next = pandas.read_csv(file,header=input_header)
-        pd = pandas.concat([pd, pd_next])
+        # values are copied as they are, so a column has the same format in
+        # all chunks
+        for chunk in pandas.read_csv(file,header=input_header,chunksize=chunk_size,
+                                    dtype=str,keep_default_na=False):
+            chunk.reindex(columns=columns).to_csv(dst_name,mode='w' if first else 'a',
+                                                index=None,header=result_header if first else False)
+            first = False
+    if first:
+        pandas.DataFrame(columns=columns).to_csv(dst_name,index=None,header=result_header)
 
-    pd.to_csv(dst_name,index=None,header=result_header)
     BuiltIn().log("Concatinated %d files to %s" % (num,dst_name))
     return True
 
 
+def _csv_read_columns(file_name,input_header,columns,chunk_size=None):
+    """ Reads only the ``columns`` of CSV file ``file_name`` as text
+
+    When ``input_header`` is ``None``, ``columns`` is a index string for
+    `Str2Seq`, otherwise it is a comma separated list of column names. With
+    ``chunk_size``, an iterator of frames of at most that number of rows is
+    returned.
+    """
+    if input_header is None:
+        width = pandas.read_csv(file_name,header=None,nrows=1).shape[1]
+        column_list = list(str2seq(columns,width))
+        header = None
+    else:
+        column_list = columns.split(',')
+        header = int(input_header)
+    # values are copied as they are, so all chunks and files have the same
+    # types
+    data = pandas.read_csv(file_name,header=header,usecols=column_list,dtype=str,
+                        keep_default_na=False,chunksize=chunk_size)
+    if chunk_size is None: return data[column_list]
+    return (chunk[column_list] for chunk in data)
+
+
+def _csv_merge_names(column_lists,key):
+    """ Returns the names of the columns of each file after the merge
+
+    The names are the same as a chain of ``pandas.merge``, a column that is
+    found in the result already is renamed with ``_x`` and the new one with
+    ``_y``. An error is raised when the renaming makes duplicated names.
+    """
+    names = list(column_lists[0])
+    owner = [(0,column) for column in column_lists[0]]
+    for i,columns in enumerate(column_lists[1:],1):
+        right = [column for column in columns if column != key]
+        same = set(names) & set(right)
+        names = [('%s_x' % name) if name in same else name for name in names] + \
+                [('%s_y' % name) if name in same else name for name in right]
+        owner += [(i,column) for column in right]
+        if len(set(names)) != len(names):
+            raise Exception("ERR: merging `%s` makes duplicated column names: %s" %
+                            (','.join(str(x) for x in columns),','.join(str(x) for x in names)))
+    result = [{key:key} for columns in column_lists]
+    for name,(i,column) in zip(names,owner):
+        result[i][column] = name
+    return result
+
+
+def _csv_join(frame_list,key):
+    """ Inner joins all frames in ``frame_list`` on column ``key`` by a chain
+    of ``pandas.merge`` and keeps the order of ``_row`` of the 1st frame
+    """
+    result = frame_list[0]
+    for frame in frame_list[1:]:
+        result = pandas.merge(result,frame,on=key)
+    return result.sort_values('_row',kind='stable')
+
+
+def _csv_partition(file_list,input_header,columns,key,rename,count,folder):
+    """ Splits the selected columns of all files in ``count`` partitions by
+    the hash of ``key`` and returns the file names of each partition
+
+    The 1st file has an additional ``_row`` column, its row number.
+    """
+    chunk_size = int(get_config_value('csv-chunk-size','default',100000))
+    part_list = [['%s/%d_%d.csv' % (folder,i,j) for i in range(len(file_list))] for j in range(count)]
+    for i,file_name in enumerate(file_list):
+        row = 0
+        for chunk in _csv_read_columns(file_name,input_header,columns,chunk_size):
+            chunk = chunk.rename(columns=rename[i])
+            if i == 0:
+                chunk.insert(0,'_row',range(row,row + len(chunk)))
+                row += len(chunk)
+            index = pandas.util.hash_pandas_object(chunk[key],index=False).values % count
+            for j,part in chunk.groupby(index):
+                part.to_csv(part_list[j][i],mode='a',index=None,header=False)
+    return part_list
+
+
+def _csv_read_part(path,names):
+    if not os.path.exists(path): return pandas.DataFrame(columns=names,dtype=str)
+    return pandas.read_csv(path,header=None,names=names,dtype=str,keep_default_na=False)
+
+
 def csv_merge(src_pattern,dst_name,input_header=None,key='0',select_column=':',result_header=True):
     """ Merges all CSV files ``horizontally`` by ``key`` key from ``src_pattern``
 
@@ -872,6 +1461,14 @@ def csv_merge(src_pattern,dst_name,input_header=None,key='0',select_column=':',r
 
     The result header (column names) is decided by ``result_header`` (`True` or `False`)
 
+    Columns that have the same name are renamed with ``_x`` and ``_y`` like a
+    chain of ``pandas.merge``, the keyword fails when that makes duplicated
+    names. Values are copied as they are in the files.
+
+    When the files are bigger than ``csv-merge-memory`` (MB) in ``default``
+    configuration, they are split by the hash of the key into temporary
+    files in the ``tmp`` folder and joined part by part.
+
     The keyword returns ``False`` if no file is found by the pattern
 
     Examples:
@@ -896,57 +1493,60 @@ def csv_merge(src_pattern,dst_name,input_header=None,key='0',select_column=':',r
     if num < 1:
         BuiltIn().log("File number is less than %d" % (num))
         return False
-    elif num < 2:
-        f1_name = file_list.pop(0)
-        if input_header is None:
-            f1  = pandas.read_csv(f1_name,header=input_header)
-            s = f1.shape
-            result = f1.iloc[:,str2seq(columns,s[1])]
-        else:
-            f1  = pandas.read_csv(f1_name,header=int(input_header))
-            result = f1[columns.split(',')]
-        result.to_csv(dst_name,index=None,header=result_header)
+
+    chunk_size = int(get_config_value('csv-chunk-size','default',100000))
+    if num < 2:
+        first = True
+        for chunk in _csv_read_columns(file_list[0],input_header,columns,chunk_size):
+            chunk.to_csv(dst_name,mode='w' if first else 'a',index=None,header=result_header if first else False)
+            first = False
         BuiltIn().log("File number is less than %d, merged anyway" % (num))
         return True
-    else:
-        f1_name = file_list.pop(0)
-        f2_name = file_list.pop(0)
-
-        if input_header is None:
-            f1  = pandas.read_csv(f1_name,header=input_header)
-            f2  = pandas.read_csv(f2_name,header=input_header)
-            s = f1.shape
-            result1 = f1.loc[:,str2seq(columns,s[1])]
-            s = f2.shape
-            result2 = f2.loc[:,str2seq(columns,s[1])]
-        else:
-            f1 = pandas.read_csv(f1_name,header=int(input_header))
-            f2 = pandas.read_csv(f2_name,header=int(input_header))
-            result1 = f1[columns.split(',')]
-            result2 = f2[columns.split(',')]
-
-        if input_header is None:
-            m  = pandas.merge(result1,result2,on=int(key))
-        else:
-            m  = pandas.merge(result1,result2,on=key)
-
-        for item in file_list:
-            if input_header is None:
-                f = pandas.read_csv(item,header=input_header)
-                s = f.shape
-                result = f.iloc[:,str2seq(columns,s[1])]
-            else:
-                f = pandas.read_csv(item,header=int(input_header))
-                result = f[columns.split(',')]
-
-            if input_header is None:
-                m = pandas.merge(m,result,on=int(key))
-            else:
-                m = pandas.merge(m,result,on=key)
 
+    if input_header is None: key = int(key)
+    column_lists = [list(next(_csv_read_columns(item,input_header,columns,1)).columns) for item in file_list]
+    rename = _csv_merge_names(column_lists,key)
+    # names of the columns of each file and of the result
+    part_names = [[rename[i][column] for column in column_lists[i]] for i in range(num)]
+    names = part_names[0] + [name for i in range(1,num) for name in part_names[i] if name != key]
+
+    limit = float(get_config_value('csv-merge-memory','default',256)) * 1024 * 1024
+    count = int(sum(os.path.getsize(item) for item in file_list) // limit) + 1
+    if count == 1:
+        frame_list = [_csv_read_columns(item,input_header,columns).rename(columns=rename[i])
+                        for i,item in enumerate(file_list)]
+        frame_list[0].insert(0,'_row',range(len(frame_list[0])))
+        m = _csv_join(frame_list,key)
         # write to file without index
-        m.to_csv(dst_name,index=None,header=result_header)
-        BuiltIn().log("Merged %d files to %s" % (num,dst_name))
+        m[names].to_csv(dst_name,index=None,header=result_header)
+    else:
+        tmp_folder = os.getcwd() + '/tmp'
+        folder = tempfile.mkdtemp(prefix='csv_merge_',dir=tmp_folder if os.path.isdir(tmp_folder) else None)
+        try:
+            part_list = _csv_partition(file_list,input_header,columns,key,rename,count,folder)
+            # join each partition, then merge the partitions by the row
+            # number of the 1st file
+            out_list = []
+            for j,paths in enumerate(part_list):
+                frame_list = [_csv_read_part(path,(['_row'] if i == 0 else []) + part_names[i])
+                                for i,path in enumerate(paths)]
+                frame_list[0]['_row'] = frame_list[0]['_row'].astype(int)
+                out = '%s/out_%d.csv' % (folder,j)
+                _csv_join(frame_list,key)[['_row'] + names].to_csv(out,index=None,header=False)
+                out_list.append(out)
+            file_handles = [open(out,newline='') for out in out_list]
+            try:
+                readers = [csv.reader(f) for f in file_handles]
+                with open(dst_name,'w',newline='') as f:
+                    writer = csv.writer(f,lineterminator=os.linesep)
+                    if result_header: writer.writerow(names)
+                    for row in heapq.merge(*readers,key=lambda row: int(row[0])):
+                        writer.writerow(row[1:])
+            finally:
+                for f in file_handles: f.close()
+        finally:
+            shutil.rmtree(folder,ignore_errors=True)
+    BuiltIn().log("Merged %d files to %s" % (num,dst_name))
 
     return True
 
@@ -1026,7 +1626,7 @@ def file_md5(path):
     """
     hash_md5 = hashlib.md5()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""): hash_md5.update(chunk)
+        for chunk in iter(lambda: f.read(1048576), b""): hash_md5.update(chunk)
 
     result = hash_md5.hexdigest()
     BuiltIn().log("Hash of file `%s` is %s" % (path,result))
@@ -1128,24 +1728,152 @@ def _wait_thread(*stuff):
     for something in stuff: something.join()
 
 
+### log scanner
+_SCAN_CHUNK_SIZE = 1024*1024
+
+def _compile_prefilter(pattern_list,flags):
+    """ Returns a regex that matches any of ``pattern_list`` in a chunk of lines
+    or ``None`` when the patterns could not be checked by chunk
+    """
+    if not pattern_list: return None
+    if any('\\A' in item or '\\Z' in item for item in pattern_list): return None
+    try:
+        return re.compile('|'.join('(?:%s)' % item for item in pattern_list),flags | re.MULTILINE)
+    except re.error:
+        return None
+
+
+def _scan_file(path,keyword_line,match_regexp,keyword):
+    """ Scans file ``path`` once for all patterns and returns a tuple of 3 lists
+    of matched line numbers, one for each kind of patterns.
+
+    - ``keyword_line``: regexes searched in the lowered line
+    - ``match_regexp``: regexes matched from the beginning of the line
+    - ``keyword``: words compared with the lowered words of the line, a line
+    number is added for each matched word
+
+    The file is read by chunks. A chunk is split into lines only when any of
+    the patterns could be found in it.
+    """
+    line_regex  = [re.compile(item.lower()) for item in keyword_line]
+    match_regex = [re.compile(item) for item in match_regexp]
+    words       = [item.lower() for item in keyword]
+    line_pre    = _compile_prefilter([item.lower() for item in keyword_line],0)
+    match_pre   = _compile_prefilter(['^(?:%s)' % item for item in match_regexp],0)
+    result = ([[] for item in line_regex],[[] for item in match_regex],[[] for item in words])
+
+    line_no = 0
+    rest = ''
+    with open(path,'r',encoding='utf-8',errors='replace') as f:
+        while True:
+            data = f.read(_SCAN_CHUNK_SIZE)
+            buf = rest + data
+            if data:
+                pos = buf.rfind('\n') + 1
+                buf,rest = buf[:pos],buf[pos:]
+            if buf == '':
+                if not data: break
+                continue
+            lower = buf.lower()
+            check_line  = line_regex and (line_pre is None or line_pre.search(lower))
+            check_match = match_regex and (match_pre is None or match_pre.search(buf))
+            check_word  = [word for word in words if word in lower]
+            if not (check_line or check_match or check_word):
+                line_no += buf.count('\n')
+                if buf[-1:] != '\n': line_no += 1
+            else:
+                lines = buf.split('\n')
+                last = lines.pop()
+                lines = [line + '\n' for line in lines]
+                if last: lines.append(last)
+                for line in lines:
+                    line_no += 1
+                    lower_line = line.lower()
+                    if check_line:
+                        for i,regex in enumerate(line_regex):
+                            if regex.search(lower_line): result[0][i].append(line_no)
+                    if check_match:
+                        for i,regex in enumerate(match_regex):
+                            if regex.match(line): result[1][i].append(line_no)
+                    if check_word:
+                        line_words = lower_line.split()
+                        for i,word in enumerate(words):
+                            if word in check_word:
+                                result[2][i] += [line_no] * line_words.count(word)
+            if not data: break
+    return result
+
+
+def scan_files(pattern_list,keyword_line=None,match_regexp=None,keyword=None,worker=None):
+    """ Scans files matched ``pattern_list`` once for many patterns and
+    returns the matched results
+
+    ``pattern_list`` is a file glob pattern or a list of them. Patterns are:
+    - ``keyword_line``: regexes that are searched in each line, not
+      case-sensitive. See `Count Keyword Line`
+    - ``match_regexp``: regexes that are matched from the beginning of each
+      line. See `Count Match RegExp`
+    - ``keyword``: words that are compared with each word, not case-sensitive.
+      See `Count Keyword`
+
+    Each of them is a pattern or a list of patterns. The result is a dictionary
+    with ``keyword_line``, ``match_regexp`` and ``keyword`` keys. Each of them
+    is a dictionary of the pattern and its ``count`` and ``line``, the list
+    of (file, line number) where it was found.
+
+    Files are spread to ``worker`` processes. Default is ``scan-worker`` in
+    ``default`` configuration or 1 (scan in the current process).
+
+    Examples:
+    | @{keyword}=   | Create List | error | fail |
+    | ${result}=    | Common.`Scan Files` | result/*.log | keyword_line=${keyword} |
+    | Log           | ${result['keyword_line']['error']['count']} |
+    """
+    def _to_list(item):
+        if item is None: return []
+        if isinstance(item,str): return [item]
+        return list(item)
+
+    keyword_line    = _to_list(keyword_line)
+    match_regexp    = _to_list(match_regexp)
+    keyword         = _to_list(keyword)
+    file_list = []
+    for pattern in _to_list(pattern_list):
+        for file in glob.glob(pattern):
+            if file not in file_list: file_list.append(file)
+
+    if worker is None: worker = get_config_value('scan-worker','default',1)
+    worker = max(1,min(int(worker),len(file_list)))
+    args = (keyword_line,match_regexp,keyword)
+    if worker == 1:
+        file_result = [_scan_file(file,*args) for file in file_list]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=worker) as pool:
+            file_result = list(pool.map(_scan_file,file_list,*[[item]*len(file_list) for item in args]))
+
+    result = {}
+    for k,(name,items) in enumerate((('keyword_line',keyword_line),('match_regexp',match_regexp),('keyword',keyword))):
+        result[name] = OrderedDict()
+        for i,item in enumerate(items):
+            lines = []
+            for file,data in zip(file_list,file_result):
+                if data[k][i]:
+                    BuiltIn().log("    Found `%s` in file `%s` at line: %s" % (item,file,','.join(str(x) for x in data[k][i])))
+                lines += [(file,x) for x in data[k][i]]
+            result[name][item] = {'count':len(lines),'line':lines}
+
+    BuiltIn().log("Scanned %d files for %d patterns" % (len(file_list),len(keyword_line)+len(match_regexp)+len(keyword)))
+    return result
+
+
 def count_keyword_line(keyword,*pattern_list):
     """ Count the number of lines contains the ``keyword``
 
     *Notes:* Keyword is matched partially. For example, ``error`` or
     ``errorXXX`` will be matched by ``error`` keyword.
     """
-    counter = 0
-    for pattern in pattern_list:
-        file_list = glob.glob(pattern)
-        for file in file_list:
-            with open(file,"r") as f:
-                BuiltIn().log("Check keyword in file `%s`" % file)
-                for i,line in enumerate(f.readlines()):
-                    pattern = re.compile(keyword.lower())
-                    if re.search(pattern,line.lower()):
-                        counter += 1
-                        BuiltIn().log("    Found matched keyword in line number: %d" % (i))
-
+    counter = scan_files(pattern_list,keyword_line=keyword)['keyword_line'][keyword]['count']
     BuiltIn().log("Found %d lines contain keyword `%s`" % (counter,keyword))
     return counter
 
@@ -1170,18 +1898,7 @@ def count_match_regexp(regexp,*pattern_list):
     Examples:
     | ${err_num}= | `Count Match RegExp` | .*error.* | result/*.csv | result/*.txt |
     """
-    counter = 0
-    for pattern in pattern_list:
-        file_list = glob.glob(pattern)
-        for file in file_list:
-            with open(file,"r") as f:
-                BuiltIn().log("Find pattern `%s` in file `%s`" % (regexp,file))
-                for i,line in enumerate(f.readlines()):
-                    res = re.match(regexp, line)
-                    if res is None: continue
-                    counter += 1
-                    BuiltIn().log("    Found match in line number: %d" % (i))
-
+    counter = scan_files(pattern_list,match_regexp=regexp)['match_regexp'][regexp]['count']
     BuiltIn().log("Found %d matching of `%s`" % (counter,regexp))
     return counter
 
@@ -1189,16 +1906,7 @@ def count_match_regexp(regexp,*pattern_list):
 def count_keyword(keyword,*pattern_list):
     """ Count the keyword in files. Keyword is not case-sensitive
     """
-
-    counter = 0
-    for pattern in pattern_list:
-        file_list = glob.glob(pattern)
-        for file in file_list:
-            with open(file,"r") as f:
-                BuiltIn().log("Check keyword in file `%s`" % file)
-                for word in [word for line in f for word in line.split()]:
-                    if word.lower() == keyword.lower(): counter += 1
-
+    counter = scan_files(pattern_list,keyword=keyword)['keyword'][keyword]['count']
     BuiltIn().log("Found %d keyword `%s`" % (counter,keyword))
     return counter
 
@@ -1254,7 +1962,136 @@ def fold_str(str):
     return result
 
 
-def follow_syslog_and_trap(pattern,logname=u"syslog-trap.log",delay=u'2s'):
+### log file tailer
+_IN_MODIFY      = 0x002
+_IN_ATTRIB      = 0x004
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF   = 0x800
+
+def _inotify_open(path):
+    """ Returns an inotify fd that watches ``path`` or ``None`` if inotify is
+    not available
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'),use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0: return None
+        mask = _IN_MODIFY | _IN_ATTRIB | _IN_DELETE_SELF | _IN_MOVE_SELF
+        if libc.inotify_add_watch(fd,path.encode('utf-8'),mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except Exception:
+        return None
+
+
+class _LogWaiter(object):
+    """ A wait for a set of patterns in a followed file
+    """
+    def __init__(self,pattern_list,offset,match_all):
+        self.patterns   = [re.compile(x) for x in pattern_list]
+        self.offset     = offset
+        self.match_all  = match_all
+        self.lines      = []
+        self.done       = threading.Event()
+
+    def feed(self,line):
+        """ Matches ``line`` against the remaining patterns
+        """
+        for pattern in [x for x in self.patterns if x.search(line)]:
+            self.patterns.remove(pattern)
+            self.lines.append(line)
+            if not self.match_all or not self.patterns:
+                self.done.set()
+                return
+
+
+class _LogTailer(threading.Thread):
+    """ Follows a growing file and feeds new lines to its waiters
+
+    The tailer wakes up by inotify when the file is changed. It also checks
+    the file every ``interval`` seconds for systems that inotify does not
+    work (e.g. a file written by other hosts over NFS). The tailer finishes
+    when there is no waiter left.
+    """
+    def __init__(self,path,interval):
+        super(_LogTailer,self).__init__(daemon=True)
+        self.path       = path
+        self.interval   = interval
+        self.waiters    = []
+        self._file      = open(path,'rb')
+        self._file.seek(0,os.SEEK_END)
+        self._offset    = self._file.tell()
+        self._rest      = b''
+
+    def _read(self):
+        """ Feeds new complete lines to the waiters
+        """
+        if os.stat(self.path).st_size < self._offset:
+            # the file was truncated or rotated
+            self._file.close()
+            self._file      = open(self.path,'rb')
+            self._offset    = 0
+            self._rest      = b''
+        self._file.seek(self._offset)
+        data = self._file.read()
+        if not data: return
+        start = self._offset - len(self._rest)
+        self._offset += len(data)
+        lines = (self._rest + data).split(b'\n')
+        self._rest = lines.pop()
+        with _log_tailer_lock:
+            waiters = list(self.waiters)
+        for line in lines:
+            end = start + len(line) + 1
+            text = line.decode('utf-8','replace').rstrip('\r')
+            for waiter in waiters:
+                if end > waiter.offset and not waiter.done.is_set(): waiter.feed(text)
+            start = end
+
+    def run(self):
+        fd = _inotify_open(self.path)
+        try:
+            while True:
+                with _log_tailer_lock:
+                    self.waiters = [x for x in self.waiters if not x.done.is_set()]
+                    if not self.waiters:
+                        _log_tailers.pop(self.path,None)
+                        break
+                    interval = self.interval
+                if fd is None:
+                    time.sleep(interval)
+                else:
+                    ready,_,_ = select.select([fd],[],[],interval)
+                    if ready: os.read(fd,4096)
+                self._read()
+        finally:
+            if fd is not None: os.close(fd)
+            self._file.close()
+
+
+_log_tailers        = {}
+_log_tailer_lock    = threading.Lock()
+
+def _follow_file(path,pattern_list,interval,match_all=False):
+    """ Registers a wait for ``pattern_list`` in lines that are added to
+    ``path`` from now and returns it
+    """
+    with _log_tailer_lock:
+        waiter = _LogWaiter(pattern_list,os.stat(path).st_size,match_all)
+        tailer = _log_tailers.get(path)
+        if tailer is None:
+            tailer = _LogTailer(path,interval)
+            _log_tailers[path] = tailer
+            tailer.waiters.append(waiter)
+            tailer.start()
+        else:
+            tailer.interval = min(tailer.interval,interval)
+            tailer.waiters.append(waiter)
+    return waiter
+
+
+def follow_syslog_and_trap(pattern,logname=u"syslog-trap.log",delay=u'2s',timeout=None,match_all=False):
     """ Pauses the execution and wait for the pattern is matched if the file
     `log_file_name` located in the current result folder.
 
@@ -1263,33 +2100,46 @@ def follow_syslog_and_trap(pattern,logname=u"syslog-trap.log",delay=u'2s'):
 
     The keyword should be in tests between `Follow Syslog and Trap Start` and
     `Follow Syslog and Trap Stop` keywords.
+
+    ``pattern`` is a regular expression or a list of them. The keyword
+    finishes when one of the patterns is found, or all of them when
+    ``match_all`` is ``${TRUE}``. Only lines added after the keyword started
+    are checked. The matched lines are returned.
+
+    The file is followed by inotify when it is available, so the keyword
+    returns right after the line is written. ``delay`` is the interval to
+    check the file when inotify is not available or does not work (e.g. a
+    file written over NFS). When ``timeout`` is defined, the keyword fails if
+    the pattern is not found in time. Several waits (for example from
+    parallel keywords) for a same file share one follower.
+
+    Examples:
+    | `Follow Syslog And Trap` | LINK_DOWN |
+    | `Follow Syslog And Trap` | ${PATTERNS} | timeout=1m | match_all=${TRUE} |
     """
     if BuiltIn().get_variable_value('${RENAT_BATCH}') is not None:
         BuiltIn().log("Pausing is ignored in batch mode")
         return
 
-    match_pattern = re.compile(pattern)
+    pattern_list = [pattern] if isinstance(pattern,str) else list(pattern)
 
     filepath = "%s/%s_%s" % ( BuiltIn().get_variable_value("${WORKING_FOLDER}"),
                                 BuiltIn().get_variable_value("${MYID}"),
                                 logname)
-    logfile = open(filepath,'rt',1)
-    logfile.seek(0,os.SEEK_END)
 
     wait_msg = "Waiting for `%s` in remote file `%s`" % (pattern,filepath)
     BuiltIn().log(wait_msg,console=True)
 
-    matched = False
-    while not matched:
-        lines = logfile.readlines()
-        for line in lines:
-            BuiltIn().log_to_console(line)
-            if match_pattern.search(line):
-                matched = True
-                break
-        time.sleep(DateTime.convert_time(delay))
-    logfile.close()
+    waiter = _follow_file(filepath,pattern_list,DateTime.convert_time(delay),match_all)
+    matched = waiter.done.wait(None if timeout is None else DateTime.convert_time(timeout))
+    waiter.done.set()
+    lines = list(waiter.lines)
+    for line in lines:
+        BuiltIn().log_to_console(line)
+    if not matched:
+        raise Exception("ERR: could not find pattern `%s` in log file `%s` in %s" % (pattern,logname,timeout))
     BuiltIn().log('Found pattern `%s` in log file `%s`' % (pattern,logname))
+    return lines
 
 
 def set_multi_item_variable(*vars):
@@ -1444,12 +2294,178 @@ def get_config_value(key,base=u'default',default=None):
 
 
 
+### jinja2 template cache
+_jinja2_lock        = threading.Lock()
+_jinja2_env         = {}
+_jinja2_bcc         = None
+_template_cache     = OrderedDict()
+_render_cache       = OrderedDict()
+# variables that are only hashed by the items a template accesses
+_CONFIG_VARS        = ('LOCAL','GLOBAL')
+# templates using these could not be cached
+_RANDOM_FILTERS     = ('random','shuffle')
+_RANDOM_FUNCS       = ('lipsum',)
+
+def _get_jinja2_env(folder):
+    """ Returns the shared jinja2 environment of ``folder``
+
+    All environments share one bytecode cache in RENAT ``tmp`` folder
+    """
+    global _jinja2_bcc
+    env = _jinja2_env.get(folder)
+    if env is None:
+        if _jinja2_bcc is None:
+            bcc_folder = _tmp_folder + '/jinja2'
+            try:
+                if not os.path.exists(bcc_folder): os.makedirs(bcc_folder)
+                _jinja2_bcc = jinja2.FileSystemBytecodeCache(bcc_folder)
+            except OSError:
+                _jinja2_bcc = None
+        env = jinja2.Environment(loader=jinja2.FileSystemLoader(folder),
+                                bytecode_cache=_jinja2_bcc,auto_reload=True)
+        _jinja2_env[folder] = env
+    return env
+
+
+def _get_template(folder,file_name):
+    """ Returns a tuple of the path, the compiled template, the variable names
+    and the included file paths of ``file_name`` in ``folder``
+
+    Variable names and included files are collected from all templates that
+    are included or imported, directly or not. Each name is a tuple of the
+    variable and the key used in ``LOCAL`` or ``GLOBAL`` (``None`` when the
+    whole variable is used). The variable names are ``None`` when a template
+    refers another one dynamically (by a variable) or uses a random value, so
+    the result of that template could not be cached.
+
+    Compiled templates are kept in a LRU keyed by path and modification time.
+    The size of the LRU is ``template-cache-size`` in ``default`` configuration.
+    """
+    path = os.path.abspath(os.path.join(folder,file_name))
+    key = (path,os.path.getmtime(path))
+    with _jinja2_lock:
+        entry = _template_cache.get(key)
+        if entry is not None:
+            _template_cache.move_to_end(key)
+            return entry
+        env = _get_jinja2_env(folder)
+    template = env.get_template(file_name)
+    names = set()
+    includes = []
+    dynamic = False
+    queue = [file_name]
+    seen = set(queue)
+    while queue:
+        item = queue.pop()
+        try:
+            source = env.loader.get_source(env,item)[0]
+        except jinja2.TemplateNotFound:
+            continue
+        ast = env.parse(source)
+        top = jinja2_meta.find_undeclared_variables(ast)
+        if any(node.name in _RANDOM_FILTERS for node in ast.find_all(jinja2.nodes.Filter)) or \
+            any(node.name in _RANDOM_FUNCS for node in ast.find_all(jinja2.nodes.Name)):
+            dynamic = True
+        # only the parts of LOCAL and GLOBAL accessed by a constant key
+        parts = {}
+        for node in ast.find_all((jinja2.nodes.Getitem,jinja2.nodes.Getattr)):
+            if not isinstance(node.node,jinja2.nodes.Name) or node.node.name not in _CONFIG_VARS: continue
+            if isinstance(node,jinja2.nodes.Getattr):
+                parts[id(node.node)] = node.attr
+            elif isinstance(node.arg,jinja2.nodes.Const):
+                parts[id(node.node)] = node.arg.value
+        names.update((name,None) for name in top if name not in _CONFIG_VARS)
+        for node in ast.find_all(jinja2.nodes.Name):
+            if node.name in _CONFIG_VARS and node.name in top:
+                names.add((node.name,parts.get(id(node))))
+        for ref in jinja2_meta.find_referenced_templates(ast):
+            if ref is None:
+                dynamic = True
+            elif ref not in seen:
+                seen.add(ref)
+                queue.append(ref)
+                includes.append(os.path.abspath(os.path.join(folder,ref)))
+    entry = (path,template,None if dynamic else sorted(names,key=repr),includes)
+    size = int(get_config_value('template-cache-size','default',64))
+    with _jinja2_lock:
+        _template_cache[key] = entry
+        while len(_template_cache) > size: _template_cache.popitem(last=False)
+    return entry
+
+
+def render_template(file_name,render_var=None,folder=None):
+    """ Renders jinja2 template ``file_name`` in ``folder`` with variables in
+    ``render_var`` and returns the result.
+
+    ``LOCAL`` and ``GLOBAL`` are always available to the template. Default
+    ``folder`` is the ``config`` folder of current test case.
+
+    Compiled templates and the rendered results are cached. A result is reused
+    when the template, its included files and the contents of the variables
+    it refers to are not changed. Only the items of ``LOCAL`` and ``GLOBAL``
+    that the template accesses by a constant key (e.g. ``LOCAL['node']``) are
+    compared. Templates that include other templates by a variable or use
+    ``random`` or ``lipsum`` are always rendered. Sizes of the caches are
+    ``template-cache-size`` and ``render-cache-size`` in ``default``
+    configuration.
+
+    Example:
+    | ${config}= | Common.`Render Template` | vmx11.conf |
+    """
+    if folder is None: folder = get_item_config_path()
+    path,template,names,includes = _get_template(folder,file_name)
+    var = {'LOCAL':LOCAL,'GLOBAL':GLOBAL}
+    if render_var: var.update(render_var)
+
+    if names is None: return template.render(var)
+
+    # the key is the hash of the contents of the variables used by the
+    # template and its included templates
+    used_var = []
+    for name,part in names:
+        value = var.get(name)
+        if part is not None:
+            try:
+                value = value[part]
+            except (KeyError,IndexError,TypeError):
+                value = ('__missing__',)
+        used_var.append((name,part,value))
+    used_file = [(item,os.path.getmtime(item)) for item in includes if os.path.exists(item)]
+    key = (path,os.path.getmtime(path),
+            hashlib.md5(repr((used_var,used_file)).encode('utf-8')).hexdigest())
+    with _jinja2_lock:
+        result = _render_cache.get(key)
+        if result is not None:
+            _render_cache.move_to_end(key)
+            return result
+    result = template.render(var)
+    size = int(get_config_value('render-cache-size','default',256))
+    with _jinja2_lock:
+        _render_cache[key] = result
+        while len(_render_cache) > size: _render_cache.popitem(last=False)
+    return result
+
+
+def clear_template_cache():
+    """ Clears the compiled templates and the rendered results cached by
+    `Render Template`
+
+    Needed when an object given to a template changes without changing its
+    ``repr``.
+    """
+    with _jinja2_lock:
+        _template_cache.clear()
+        _render_cache.clear()
+    BuiltIn().log("Cleared template cache")
+
+
+
 def log_csv(csv_file,index=False,border=0):
     """ Logs a content of ``csv_file`` into default log.html
 
     `index`, `border` are table attributes
     """
-    df = pandas.read_csv(csv_file)
+    df = read_result(csv_file)
     BuiltIn().log(df.to_html(index=index,border=border),html=True)
 
 
@@ -1496,7 +2512,7 @@ def start_display():
     logging.getLogger("easyprocess").setLevel(logging.INFO)
     w = int(display_info['width']) + 100
     h = int(display_info['height']) + 100
-    DISPLAY = Display(visible=0, size=(w,h))
+    DISPLAY = pyvirtualdisplay.Display(visible=0, size=(w,h))
     DISPLAY.start()
     time.sleep(2)
     BuiltIn().log('Started a virtual display as `%s`' % DISPLAY.new_display_var)
@@ -1788,6 +2804,7 @@ try:
         BuiltIn().set_global_variable('${CTRL_%s}' % char,chr(i))
 
     # other unicode keys from Selenium Key
+    Keys = _selenium_keys()
     for key in filter(lambda x:x[0].isupper(),dir(Keys)):
         BuiltIn().set_global_variable('${Keys.%s}' % key, getattr(Keys,key))
     BuiltIn().set_global_variable('${Keys.WIN}', u'\u00FF')
@@ -14,12 +14,13 @@
 #  limitations under the License.
 #
 
-import io,os,time,re,traceback,shutil,cv2,tempfile,json,base64
-from PIL import Image
+import io,os,time,re,traceback,shutil,tempfile,json,base64
 from difflib import SequenceMatcher
 import lxml.html
 import Common
-import numpy as np
+cv2     = Common.LazyModule('cv2')
+Image   = Common.LazyModule('PIL.Image')
+np      = Common.LazyModule('numpy')
 from decorator import decorate
 from WebApp import WebApp,with_reconnect,session_check
 from robot.libraries.BuiltIn import BuiltIn
@@ -16,16 +16,36 @@
 
 import datetime
 import Common
+from concurrent.futures import ThreadPoolExecutor
 from robot.libraries.BuiltIn import BuiltIn
 from robot.libraries.BuiltIn import RobotNotRunningError
 
+def _make_note(msg,with_time,mark):
+    """ Returns the marked message, with the current time if ``with_time`` is
+    ``True``
+    """
+    if with_time :
+        note = datetime.datetime.now().strftime("%I:%M:%S%p on %B %d, %Y: ") + msg
+    else :
+        note = msg
+    return mark + ' ' + note + ' ' + mark
+
+
+def _write_note(channel,note):
+    """ Writes ``note`` to the log file of ``channel``
+    """
+    channel['logger'].write(Common.newline + Common.newline + note + Common.newline + Common.newline)
+    channel['logger'].flush()
+
+
 class Logger(object):
     """ Provides advanced logging functions. Every [./Logger.html|Logger] instance has one
     [./VChannel.html|VChannel] object and the is synchronized with the current active
     [./VChannel.html|VChannel].
 
     *Notes:* log file is not updated pararelly. Anytime a terminal is switched
-    to, it will update its log file.
+    to, it will update its log file. `Log All` is an exception, it writes to
+    all log files at the same time without switching the terminals.
     """
 
     ROBOT_LIBRARY_SCOPE = 'TEST SUITE'
@@ -64,15 +84,7 @@ class Logger(object):
 
         """
         channel = self._vchannel.get_current_channel()
-        note = ""
-        if with_time :
-            note = datetime.datetime.now().strftime("%I:%M:%S%p on %B %d, %Y: ") + msg
-        else :
-            note = msg
-        note = mark + ' ' + note + ' ' + mark
-
-        channel['logger'].write(Common.newline + Common.newline + note + Common.newline + Common.newline)
-        channel['logger'].flush()
+        _write_note(channel,_make_note(msg,with_time,mark))
 
 
     def log_all(self,msg,with_time=False,mark="***"):
@@ -94,15 +106,19 @@ class Logger(object):
 |
 | configure
 
+        The message is written directly to the log file of each channel in
+        parallel. The current channel is not changed and the sessions are not
+        read, so the output that has not been read yet will appear after the
+        message. All the log files have the same time stamp. The number of
+        writers is ``multi-worker`` in ``vchannel`` configuration.
         """
 
-        old_name = self._vchannel.current_name
-        channels = self._vchannel.get_channels()
-        for name in channels:
-            self.switch(name)
-            self.log(msg,with_time,mark)
-        if old_name: self.switch(old_name)
+        channels = list(self._vchannel.get_channels().values())
+        note = _make_note(msg,with_time,mark)
+        worker = int(Common.get_config_value('multi-worker','vchannel',16))
+        if channels:
+            with ThreadPoolExecutor(max_workers=max(1,min(worker,len(channels)))) as pool:
+                # list() raises the first error if there is any
+                list(pool.map(lambda channel: _write_note(channel,note),channels))
 
         BuiltIn().log("Wrote msg to `%d` clients" % (len(channels)))
-
-
@@ -17,7 +17,6 @@
 import requests
 import openpyxl
 import sys,os,re,glob
-import jinja2
 import Common
 from importlib import import_module
 from datetime import datetime
@@ -209,8 +208,7 @@ class OpticalSwitch(object):
             _file_name = file_name
 
         # load and evaluate jinja2 template
-        loader=jinja2.Environment(loader=jinja2.FileSystemLoader(os.getcwd() + '/config/')).get_template(_file_name)
-        conn_str = loader.render({'LOCAL':Common.LOCAL,'GLOBAL':Common.GLOBAL})
+        conn_str = Common.render_template(_file_name,folder=os.getcwd() + '/config/')
 
         # process line by line
         for line in conn_str.split("\n"):
@@ -245,8 +243,7 @@ class OpticalSwitch(object):
             _file_name = file_name
 
         # load and evaluate jinja3 template
-        loader=jinja2.Environment(loader=jinja2.FileSystemLoader(os.getcwd() + '/config/')).get_template(_file_name)
-        conn_str = loader.render({'LOCAL':Common.LOCAL,'GLOBAL':Common.GLOBAL})
+        conn_str = Common.render_template(_file_name,folder=os.getcwd() + '/config/')
 
         # process line by line
         for line in conn_str.split("\n"):
@@ -14,25 +14,318 @@
 #  limitations under the License.
 
 
-import netsnmp
 import time
 import sys,os,glob
+import math
+import bisect
+import threading
 import re
 import csv
 import json
 import inspect
 import Common
-from VChannel import VChannel
+netsnmp = Common.LazyModule('netsnmp')
+numpy   = Common.LazyModule('numpy')
+from VChannel import VChannel,_thread_cmd
 from importlib import import_module
 import robot.libraries.DateTime as DateTime
 from robot.libraries.BuiltIn import BuiltIn
 from robot.libraries.BuiltIn import RobotNotRunningError
 from types import MethodType
+from concurrent.futures import ThreadPoolExecutor
 
 # expose following keywords
 # __all__ = ['switch','cmd','exec_file','snap','snap_diff','xrun','follow_mib']
 
 
+def _snmp_request(poller,oid_list,size):
+    """ Returns ``(type,value)`` of each OID in ``oid_list``
+
+    ``size`` OIDs are requested in one GET request. OIDs that could not be
+    polled become ``None``.
+    """
+    result = []
+    for i in range(0,len(oid_list),size):
+        chunk = oid_list[i:i+size]
+        try:
+            response = [(item[1],item[2]) for item in poller.get(chunk)[:len(chunk)]]
+        except Exception:
+            response = []
+        response.extend([None] * (len(chunk) - len(response)))
+        result.extend(response)
+    return result
+
+
+def _snmp_get(poller,oid_list,size):
+    """ Returns the values of ``oid_list`` as a float list
+
+    Values that could not be polled or are not numbers become ``0.0``.
+    """
+    result = []
+    for item in _snmp_request(poller,oid_list,size):
+        try:
+            value = float(item[1])
+        except (TypeError,ValueError):
+            value = 0.0
+        result.append(value if math.isfinite(value) else 0.0)
+    return result
+
+
+def _poll_round(pool,data,size):
+    """ Polls all nodes of ``data`` in parallel and saves the values to the
+    ring buffer of each node
+
+    The sorted values of the window are updated per OID by removing the value
+    that leaves the ring buffer and inserting the new one.
+    """
+    nodes   = list(data)
+    results = pool.map(lambda node: _snmp_get(data[node]['poller'],data[node]['oid_list'],size),nodes)
+    for node,values in zip(nodes,results):
+        monitor = data[node]['monitor']
+        ranked  = data[node]['sorted']
+        row     = data[node]['pos'] % monitor.shape[0]
+        for old,new in zip(monitor[row].tolist(),values):
+            del ranked[bisect.bisect_left(ranked,old)]
+            bisect.insort(ranked,new)
+        monitor[row] = values
+        data[node]['pos'] += 1
+        data[node]['last'] = values
+
+
+def _is_stable(ranked,threshold,percentile):
+    """ Same as `Is Stable` but uses the already sorted values ``ranked``
+
+    The percentile is interpolated linearly like ``numpy.percentile``.
+    """
+    index   = (len(ranked) - 1) * percentile / 100.0
+    low     = int(math.floor(index))
+    high    = min(low + 1,len(ranked) - 1)
+    check_value = ranked[low] + (ranked[high] - ranked[low]) * (index - low)
+    result = (check_value < threshold)
+    BuiltIn().log("check_value = %s threshold = %s result=%s" % (check_value,threshold,result) )
+    return result
+
+
+def _follow_mib(data,window,interval,max_len,threshold,percentile):
+    """ Polls the nodes of ``data`` until all of them become stable
+
+    Each node keeps the last ``window`` polls of all of its OIDs in a ring
+    buffer (``window`` x ``number of OIDs``) together with the sorted values
+    of the buffer, so the percentile of each round does not sort the whole
+    window again. A poll round is started every ``interval`` seconds
+    regardless of the time spent by the polling. Returns the number of
+    evaluation rounds.
+    """
+    size    = int(Common.get_config_value('snmp-max-oid','default',32))
+    worker  = int(Common.get_config_value('snmp-worker','default',32))
+    for node in data:
+        data[node]['monitor']   = numpy.zeros((window,len(data[node]['oid_list'])))
+        data[node]['sorted']    = [0.0] * data[node]['monitor'].size
+        data[node]['pos']       = 0
+
+    with ThreadPoolExecutor(max_workers=max(1,min(worker,len(data)))) as pool:
+        for i in range(window):
+            start = time.time()
+            _poll_round(pool,data,size)
+            time.sleep(max(0,interval - (time.time() - start)))
+
+        stable  = False
+        count   = 0
+
+        BuiltIn().log("Stable checking ...")
+
+        while not stable and count < max_len:
+            start = time.time()
+            _poll_round(pool,data,size)
+            stable = True
+            for node in data:
+                stable = stable and _is_stable(data[node]['sorted'],threshold,percentile)
+                BuiltIn().log("node = %s stable = %s" % (node,stable))
+                BuiltIn().log(",".join(str(x) for x in data[node]['last']))
+
+            count += 1
+            time.sleep(max(0,interval - (time.time() - start)))
+    return count
+
+
+### keyword dispatch
+_keyword_list   = None
+_xrun_table     = {}
+
+def _get_keyword_list():
+    """ Returns the names of all keywords provided by router modules
+
+    Modules are imported only once for all Router instances.
+    """
+    global _keyword_list
+    if _keyword_list is None:
+        _keyword_list = []
+        for item in sorted(glob.glob(Common.get_renat_path() + '/router_mod/*.py')):
+            mod_name = os.path.basename(item).replace('.py','')
+            if mod_name.startswith('_'): continue
+            mod = import_module('router_mod.' + mod_name)
+            for cmd,data in inspect.getmembers(mod,inspect.isfunction):
+                if not cmd.startswith('_') and cmd not in _keyword_list:
+                    _keyword_list.append(cmd)
+    return _keyword_list
+
+
+def _resolve_keyword(type,cmd):
+    """ Returns the module name and the function that implements ``cmd`` for
+    device ``type``
+
+    The most detailed module that has the keyword is used, e.g. for
+    ``juniper-mx`` type, ``juniper_mx`` is tried before ``juniper``. The
+    result is kept for each pair of ``type`` and ``cmd``.
+    """
+    key = (type,cmd)
+    if key not in _xrun_table:
+        type_list = re.split(r'-|_',type)
+        for i in range(len(type_list),0,-1):
+            mod_name = '_'.join(type_list[0:i])
+            try:
+                mod = import_module('router_mod.' + mod_name)
+            except ImportError:
+                continue
+            if hasattr(mod,cmd):
+                _xrun_table[key] = (mod_name,getattr(mod,cmd))
+                break
+        else:
+            raise Exception("ERR: could not find keyword `%s` for device type `%s`" % (cmd,type))
+    return _xrun_table[key]
+
+
+### telemetry
+_SNMP_ERR       = ['NOSUCHINSTANCE','NOSUCHOBJECT','ENDOFMIBVIEW','ERROR']
+_COUNTER_WRAP   = {'Counter32':2**32,'Counter64':2**64}
+_COUNTER_BITS   = {'delta':None,'bps':8,'pps':1}
+
+def _telemetry_value(entry,item,old,elapsed):
+    """ Returns the value to record and the new raw value of a counter
+
+    ``item`` is the polled ``(type,value)``. Counters (``delta``, ``bps`` and
+    ``pps``) are recorded as the increment or the rate per second from ``old``
+    with wrap around of ``Counter32`` and ``Counter64``. Others are recorded
+    as they are. ``NaN`` is recorded when there is no valid value.
+    """
+    nan = float('nan')
+    if item is None or item[0] in _SNMP_ERR: return nan,None
+    try:
+        value = float(str(item[1]).strip('"'))
+    except ValueError:
+        return nan,None
+
+    disp = entry.get('disp','gauge')
+    if disp not in _COUNTER_BITS: return value,value
+    if old is None or elapsed <= 0: return nan,value
+    delta = value - old
+    if delta < 0:
+        if item[0] not in _COUNTER_WRAP: return nan,value
+        delta += _COUNTER_WRAP[item[0]]
+    if _COUNTER_BITS[disp] is None: return delta,value
+    return delta * _COUNTER_BITS[disp] / elapsed,value
+
+
+def _read_telemetry(folder,node):
+    """ Returns the header and the recorded rows of ``node`` in ``folder``
+    """
+    with open('%s/%s.json' % (folder,node)) as f:
+        header = json.load(f)
+    width   = len(header['miblist']) + 1
+    data    = numpy.fromfile('%s/%s.ts' % (folder,node),dtype='float64')
+    return header,data[:len(data) // width * width].reshape(-1,width)
+
+
+class _Telemetry(threading.Thread):
+    """ Background recorder for SNMP and CLI counters
+
+    Each node has a header ``<node>.json`` in MIB file format and a time
+    series ``<node>.ts``. The time series is a sequence of float64 rows of the
+    poll time and one value for each entry of the header.
+    """
+    def __init__(self,nodes,folder,interval,cli=None):
+        super(_Telemetry,self).__init__(daemon=True)
+        self._nodes     = nodes
+        self._folder    = folder
+        self._interval  = interval
+        self._cli       = cli
+        self._halt      = threading.Event()
+        self.count      = 0
+        self.error      = None
+        for name,node in self._nodes.items():
+            # rows are only appended to data recorded with the same miblist
+            header = '%s/%s.json' % (folder,name)
+            mode = 'wb'
+            if os.path.exists(header):
+                with open(header) as f:
+                    if json.load(f).get('miblist') == node['miblist']: mode = 'ab'
+            with open(header,'w') as f:
+                json.dump({'_comment':'telemetry of %s' % name,'interval':interval,'miblist':node['miblist']},f)
+            node['file']    = open('%s/%s.ts' % (folder,name),mode)
+            node['old']     = [None] * len(node['miblist'])
+            node['time']    = None
+
+
+    def _cli_request(self,name,node):
+        """ Returns ``(type,value)`` of the CLI entries of ``node``
+        """
+        result = {}
+        outputs = {}
+        # uses the channel directly, the current channel of ``cli`` is shared
+        channel = self._cli._channels[name]
+        for i in node['cli_index']:
+            entry = node['miblist'][i]
+            if entry['cmd'] not in outputs:
+                outputs[entry['cmd']] = _thread_cmd(channel,entry['cmd'])
+            match = re.search(entry['regex'],outputs[entry['cmd']])
+            result[i] = None if match is None else (entry.get('type','Counter64'),match.group(1))
+        return result
+
+
+    def _poll(self,name,node):
+        """ Polls and records 1 row for ``node``
+        """
+        now     = time.time()
+        items   = [None] * len(node['miblist'])
+        oid_list = [node['miblist'][i]['oid'] for i in node['oid_index']]
+        for i,item in zip(node['oid_index'],_snmp_request(node['poller'],oid_list,self._size)):
+            items[i] = item
+        if node['cli_index'] and self._cli:
+            try:
+                for i,item in self._cli_request(name,node).items(): items[i] = item
+            except Exception as err:
+                self.error = "%s: %s" % (name,err)
+
+        elapsed = 0 if node['time'] is None else now - node['time']
+        row = [now]
+        for i,entry in enumerate(node['miblist']):
+            value,node['old'][i] = _telemetry_value(entry,items[i],node['old'][i],elapsed)
+            row.append(value)
+        node['time'] = now
+        numpy.array(row,dtype='float64').tofile(node['file'])
+        node['file'].flush()
+
+
+    def run(self):
+        self._size  = int(Common.get_config_value('snmp-max-oid','default',32))
+        worker      = int(Common.get_config_value('snmp-worker','default',32))
+        with ThreadPoolExecutor(max_workers=max(1,min(worker,len(self._nodes)))) as pool:
+            while not self._halt.is_set():
+                start = time.time()
+                try:
+                    list(pool.map(lambda name: self._poll(name,self._nodes[name]),self._nodes))
+                    self.count += 1
+                except Exception as err:
+                    self.error = str(err)
+                self._halt.wait(max(0,self._interval - (time.time() - start)))
+        for node in self._nodes.values(): node['file'].close()
+
+
+    def stop(self,timeout=None):
+        self._halt.set()
+        self.join(timeout)
+
+
 class Router(object):
     """ A class provides keywords for router control. An instance of Router
     class automatically assigned methods of a VChannel class (*Note*: this is not
@@ -61,11 +354,14 @@ class Router(object):
 
     ROBOT_LIBRARY_SCOPE = 'TEST SUITE'
     ROBOT_LIBRARY_VERSION = Common.version()
+    ROBOT_LISTENER_API_VERSION = 2
 
 
     def __init__(self):
         folder = os.path.dirname(__file__)
         sys.path.append(folder)
+        self._telemetry = {}
+        self.ROBOT_LIBRARY_LISTENER = self
         try:
             self._vchannel = BuiltIn().get_library_instance('VChannel')
 
@@ -80,31 +376,23 @@ class Router(object):
             # sync the nanme with current VChannel instance
             self._cur_name = self._vchannel._current_name
 
-            #
-            mod_list = glob.glob(Common.get_renat_path() + '/router_mod/*.py')
-            keyword_list = []
-            for item in mod_list:
-                # BuiltIn().log_to_console(item)
-                if item.startswith('_'): continue
-                mod_name = os.path.basename(item).replace('.py','')
-                # BuiltIn().log_to_console(mod_name)
-                mod  = import_module('router_mod.' + mod_name)
-
-                cmd_list    = inspect.getmembers(mod, inspect.isfunction)
-                for cmd,data in cmd_list:
-                    if not cmd.startswith('_') and cmd not in keyword_list:
-                        keyword_list.append(cmd)
-                        # BuiltIn().log_to_console('   ' + cmd)
-                        def gen_xrun(cmd):
-                            def _xrun(self,*args,**kwargs):
-                                return self.xrun(cmd,*args,**kwargs)
-                            return _xrun
-                        setattr(self,cmd,MethodType(gen_xrun(cmd),self))
+            for cmd in _get_keyword_list():
+                def gen_xrun(cmd):
+                    def _xrun(self,*args,**kwargs):
+                        return self.xrun(cmd,*args,**kwargs)
+                    return _xrun
+                setattr(self,cmd,MethodType(gen_xrun(cmd),self))
 
         except RobotNotRunningError as e:
             Common.err("WARN: RENAT is not running")
 
 
+    def _close(self):
+        """ Stops running telemetry when the library goes out of scope
+        """
+        for name in list(self._telemetry):
+            self._telemetry.pop(name).stop(30)
+
 
     def xrun(self,cmd,*args,**kwargs):
         """ Runs the vendor independent keywords.
@@ -118,25 +406,11 @@ class Router(object):
         This keyword will then actually calling the correspond keyword for the device type.
         """
         channel = self.get_current_channel()
-        node    = channel['node']
-        type_list = re.split(r'-|_', channel['type'])
-        mod_name = ''
-        type_list_length = len(type_list)
-
         mod_cmd = cmd.lower().replace(' ','_')
-
-        # go back from detail mod to common mode
-        for i in range(0,type_list_length):
-            mod_name = '_'.join(type_list[0:type_list_length-i])
-            try:
-                mod  = import_module('router_mod.'+ mod_name)
-                if hasattr(mod,mod_cmd):
-                    break
-            except ImportError:
-                BuiltIn().log("    Could not find `%s`, try another one" % mod_name)
+        mod_name,func = _resolve_keyword(channel['type'],mod_cmd)
 
         BuiltIn().log("    using `%s` mod for command `%s`" %  (mod_name,cmd))
-        result = getattr(mod,mod_cmd)(self,*args,**kwargs)
+        result = func(self,*args,**kwargs)
 
         return result
 
@@ -162,6 +436,9 @@ class Router(object):
         |                            <--------(3)---------->
         |                      <---------------------(4)---------->
 
+        Nodes are polled in parallel by ``snmp-worker`` threads and OIDs of a
+        node are requested by ``snmp-max-oid`` OIDs in one GET request (both
+        in ``default`` section of the configuration).
         """
         time.sleep(DateTime.convert_time(wait_time))
 
@@ -175,43 +452,12 @@ class Router(object):
             data[node]['community']   = Common.GLOBAL['snmp-template'][type]['community']
             data[node]['mib-file']    = Common.mib_for_node(node)
             f = open(data[node]['mib-file'])
-            data[node]['oid_list']    = json.load(f)['miblist']
+            data[node]['oid_list']    = [item['oid'] for item in json.load(f)['miblist']]
             f.close()
             data[node]['poller'] = netsnmp.SNMPSession(data[node]['ip'], data[node]['community'])
-            data[node]['monitor'] = []
-
-        for i in range(int(len)):
-            for node in node_list:
-                for oid in data[node]['oid_list']:
-                    try:
-                        value = float(data[node]['poller'].get(oid['oid'])[0][2])
-                    except:
-                        value = 0.0
-                    data[node]['monitor'].insert(0,value)
-            time.sleep(interval)
-
-        stable  = False
-        count   = 0
-
-        BuiltIn().log("Stable checking ...")
 
         max_len_value = int(max_len)
-        while not stable and count < max_len_value:
-            stable = True
-            for node in node_list:
-                for oid in data[node]['oid_list']:
-                    try:
-                        value = float(data[node]['poller'].get(oid['oid'][0][2]))
-                    except:
-                        value = 0.0
-                    data[node]['monitor'].insert(0,value)
-                    data[node]['monitor'].pop()
-                stable = stable and Common.is_stable(data[node]['monitor'],float(threshold), int(percentile))
-                BuiltIn().log("node = %s stable = %s" % (node,stable))
-                BuiltIn().log(",".join(str(i) for i in data[node]['monitor']))
-
-            count += 1
-            time.sleep(interval)
+        count = _follow_mib(data,int(len),interval,max_len_value,float(threshold),int(percentile))
 
         if count < max_len_value:
             BuiltIn().log("Stable checking normaly finished")
@@ -219,4 +465,140 @@ class Router(object):
             BuiltIn().log("Stable chekcing forcely finsined")
 
 
+    def start_telemetry(self,node_list=None,interval_time='10s',name='telemetry',cli_lib=None):
+        """ Starts recording counters of ``node_list`` in background
+
+        The counters of a node are defined by its MIB file (see `MIB For Node`)
+        in the same format as ``tools/mib-*.json``. ``disp`` of each entry
+        decides how the value is recorded:
+        - ``gauge``, ``gaugef``, ``gaugef2``: the value as it is
+        - ``delta``: the increment from the previous poll
+        - ``bps``, ``pps``: the increment per second (``bps`` is multiplied
+          by 8)
+        - ``mark``: ignored
 
+        Besides ``oid``, an entry could have ``cmd`` and ``regex`` to record a
+        CLI counter. The command is executed through the channel named after
+        the node of the AChannel library ``cli_lib`` and the 1st group of
+        ``regex`` is used as the value. The channels are used in background
+        without switching, so ``cli_lib`` should be an AChannel library that is
+        only used for the telemetry (imported ``WITH NAME``).
+
+        Default ``node_list`` is all nodes that have ``snmp-polling: yes``.
+        Data is appended to ``<name>`` folder of the current result folder
+        when the recorded miblist is the same, otherwise the old data is
+        replaced. Nodes are polled every ``interval_time`` in parallel. Running
+        telemetry is stopped at the end of the suite.
+
+        Examples:
+        | Router.`Start Telemetry` | interval_time=5s |
+        | Router.`Start Telemetry` | ${NODES} | cli_lib=Telemetry |
+        """
+        if name in self._telemetry:
+            raise Exception("ERR: telemetry `%s` is already running" % name)
+        if node_list is None:
+            node_list = [x for x in Common.LOCAL['node'] if Common.LOCAL['node'][x].get('snmp-polling')]
+        elif isinstance(node_list,str):
+            node_list = [x.strip() for x in node_list.split(',')]
+        cli = None if cli_lib is None else BuiltIn().get_library_instance(cli_lib)
+
+        nodes = {}
+        for node in node_list:
+            device = Common.LOCAL['node'][node]['device']
+            type   = Common.GLOBAL['device'][device]['type']
+            with open(Common.mib_for_node(node)) as f:
+                miblist = [x for x in json.load(f)['miblist'] if x.get('disp') != 'mark']
+            nodes[node] = {}
+            nodes[node]['miblist']      = miblist
+            nodes[node]['oid_index']    = [i for i,x in enumerate(miblist) if 'oid' in x]
+            nodes[node]['cli_index']    = [i for i,x in enumerate(miblist) if 'oid' not in x and 'cmd' in x]
+            nodes[node]['poller']       = netsnmp.SNMPSession(Common.GLOBAL['device'][device]['ip'], \
+                                            Common.GLOBAL['snmp-template'][type]['community'])
+
+        folder = '%s/%s' % (Common.get_result_path(),name)
+        if not os.path.exists(folder): os.makedirs(folder)
+        recorder = _Telemetry(nodes,folder,DateTime.convert_time(interval_time),cli)
+        recorder.start()
+        self._telemetry[name] = recorder
+        BuiltIn().log("Started telemetry `%s` for %d nodes" % (name,len(nodes)))
+
+
+    def stop_telemetry(self,name='telemetry',timeout='30s'):
+        """ Stops the telemetry ``name`` started by `Start Telemetry`
+
+        The recorded data is kept and could be read by `Query Telemetry` or
+        `Export Telemetry`.
+        """
+        if name not in self._telemetry:
+            raise Exception("ERR: telemetry `%s` is not running" % name)
+        recorder = self._telemetry.pop(name)
+        recorder.stop(DateTime.convert_time(timeout))
+        if recorder.error:
+            BuiltIn().log("WARN: telemetry `%s` had errors: %s" % (name,recorder.error))
+        BuiltIn().log("Stopped telemetry `%s` after %d polls" % (name,recorder.count))
+
+
+    def query_telemetry(self,node,window=None,percentile='50,90,99',name='telemetry'):
+        """ Returns the statistics of the recorded values of ``node``
+
+        The result is a dictionary with the ``description`` of each entry as
+        the key. Each value is a dictionary of ``count``, ``last``, ``min``,
+        ``max``, ``mean`` and the value at each of ``percentile``
+        (comma separated) as ``p50``, ``p90`` ... Values of ``bps`` and ``pps``
+        entries are rates. Polls that have no valid value are ignored.
+
+        When ``window`` is defined, only the data of last ``window`` is used.
+        The keyword could be used while the telemetry is running.
+
+        Examples:
+        | ${stat}= | Router.`Query Telemetry` | vmx11 | 5min |
+        | Should Be True | ${stat['CPU-RE0']['p90']} < 80 |
+        """
+        header,data = _read_telemetry('%s/%s' % (Common.get_result_path(),name),node)
+        if window is not None:
+            data = data[data[:,0] >= time.time() - DateTime.convert_time(window)]
+        points = [x.strip() for x in str(percentile).split(',') if x.strip() != '']
+
+        result = {}
+        for i,entry in enumerate(header['miblist']):
+            values = data[:,i+1]
+            values = values[~numpy.isnan(values)]
+            stat = {'count':int(values.size)}
+            empty = values.size == 0
+            stat['last']    = None if empty else float(values[-1])
+            stat['min']     = None if empty else float(values.min())
+            stat['max']     = None if empty else float(values.max())
+            stat['mean']    = None if empty else float(values.mean())
+            for item in points:
+                stat['p' + item] = None if empty else float(numpy.percentile(values,float(item)))
+            result[entry.get('description',str(i))] = stat
+
+        BuiltIn().log("Queried %d polls of `%s` from telemetry `%s`" % (len(data),node,name))
+        return result
+
+
+    def export_telemetry(self,node,dst_file=None,name='telemetry'):
+        """ Exports the recorded values of ``node`` to a CSV file
+
+        The file has the same format as the output of ``tools/Polling.rb``.
+        Values that are not available are written as ``-``. Default
+        ``dst_file`` is ``<name>_<node>.csv`` in the current result folder.
+
+        Examples:
+        | Router.`Export Telemetry` | vmx11 |
+        """
+        header,data = _read_telemetry('%s/%s' % (Common.get_result_path(),name),node)
+        if dst_file is None:
+            dst_file = '%s/%s_%s.csv' % (Common.get_result_path(),name,node)
+        with open(dst_file,'w') as f:
+            f.write('#time')
+            for entry in header['miblist']:
+                f.write(',%s:%s' % (entry.get('description',''),entry.get('disp','gauge')))
+            f.write('\n')
+            for row in data:
+                f.write(time.strftime('%Y/%m/%d %H:%M:%S ',time.localtime(row[0])))
+                for value in row[1:]:
+                    f.write(',-' if numpy.isnan(value) else ',%s' % ('%.2f' % value).rstrip('0').rstrip('.'))
+                f.write('\n')
+        BuiltIn().log("Exported %d polls of `%s` to `%s`" % (len(data),node,dst_file))
+        return dst_file
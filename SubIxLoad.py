@@ -163,15 +163,18 @@ class SubIxLoad(Process):
         file_list.remove('')
 
         try:
+            copied = []
             for item in file_list:
                 dst = item.replace('-','')
                 dst =  dst.replace(' ','_')
                 dst =  dst.replace('__','_')
+                dst_path = "%s/%s%s" % (result_folder,prefix,dst)
                 try:
-                    self.ix.retrieveFileCopy("%s/%s" % (ixload_tmp_dir,item), "%s/%s%s" % (result_folder,prefix,dst))
+                    self.ix.retrieveFileCopy("%s/%s" % (ixload_tmp_dir,item), dst_path)
+                    copied.append(dst_path)
                 except Exception as err:
                     if not ignore_not_found: raise err
-            self.result_queue.put(["ixload::ok"])
+            self.result_queue.put(["ixload::ok",copied])
         except Exception as err:
             self.result_queue.put([err])
         self.task_queue.task_done()
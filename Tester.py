@@ -23,14 +23,8 @@ import yaml
 import time
 import Common
 import requests
-try:
-    import IxNetwork
-except:
-    pass
-try:
-    import SubIxLoad
-except:
-    pass
+IxNetwork = Common.LazyModule('IxNetwork')
+SubIxLoad = Common.LazyModule('SubIxLoad')
 from datetime import datetime
 from robot.libraries.BuiltIn import BuiltIn
 import robot.libraries.DateTime as DateTime
@@ -14,24 +14,29 @@
 #  limitations under the License.
 
 
-import os,re,sys,threading
+import os,re,sys,threading,select,socket
 import yaml,datetime,time
-import jinja2,difflib
+import difflib
 import pyte
 import codecs
+import atexit
+import collections
 import traceback
 import telnetlib
+from concurrent.futures import ThreadPoolExecutor,as_completed,wait as futures_wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import Common
 import SSHLibrary
 from decorator import decorate
 from robot.libraries.Telnet import Telnet
 from robot.libraries.BuiltIn import BuiltIn
 import robot.libraries.DateTime as DateTime
+import paramiko
 from paramiko import SSHException
 
 
 ### module methods
-def _thread_exec_file(channel,prefix,vars=''):
+def _thread_exec_file(channel,prefix,vars='',deadline=None,stop=None):
     # load and evaluate jinja2 template
     folder = os.getcwd() + "/config/"
     filename = prefix + channel['node'] + '.conf'
@@ -40,29 +45,807 @@ def _thread_exec_file(channel,prefix,vars=''):
         raise Exception("ERR: could not found file `%s`" % filepath)
         return
 
-    loader=jinja2.Environment(loader=jinja2.FileSystemLoader(folder)).get_template(filename)
     render_var = {'LOCAL':Common.LOCAL,'GLOBAL':Common.GLOBAL}
     for pair in vars.split(','):
         info = pair.split("=")
         if len(info) == 2: render_var.update({info[0].strip():info[1].strip()})
 
-    command_list = loader.render(render_var).splitlines()
+    command_list = Common.render_template(filename,render_var,folder).splitlines()
 
+    result = []
     for line in command_list:
         if line.startswith("# "): continue
         cmd = line.rstrip()
         if cmd == '': continue
-        channel['connection'].write_bare(cmd + "\r")
-        cur_prompt  =  channel['prompt']
-        output = channel['connection'].read_until_regexp(cur_prompt)
-        _log(output,channel)
+        if stop is not None and stop.is_set():
+            raise Exception("ERR: stopped before executing `%s`" % cmd)
+        result.append(_thread_cmd(channel,cmd,deadline=deadline,stop=stop))
+    return ''.join(result)
 
 
-def _thread_cmd(channel,cmd):
-    cur_prompt  =  channel['prompt']
+def _thread_cmd(channel,cmd,prompt=None,deadline=None,stop=None):
+    """ Executes ``cmd`` on ``channel`` and returns the output
+
+    When ``deadline`` (an epoch time) is defined, the command fails if the
+    prompt does not appear before that time, otherwise the ``timeout`` of the
+    channel is used for each command, with or without ``stop``. When ``stop``
+    (an event) is set, the command is not sent or the wait for the prompt is
+    interrupted. The output is logged after it
+    is rendered like `Read`, the raw output is returned.
+    """
+    if stop is not None and stop.is_set():
+        raise Exception("ERR: stopped before executing `%s`" % cmd)
+    cur_prompt  =  prompt or channel['prompt']
+    # in case something left in the buffer
+    output = channel['connection'].read()
+    if output: _log(_render_output(channel,output),channel)
     channel['connection'].write_bare(cmd + "\r")
-    output = channel['connection'].read_until_regexp(cur_prompt)
-    _log(output,channel)
+    if deadline is not None:
+        wait = max(deadline - time.time(),0)
+    else:
+        # same as the default timeout of the session libraries
+        wait = DateTime.convert_time(channel['timeout']) if channel['timeout'] else 180
+    output = _read_until(channel,cur_prompt,wait,error_on_timeout=True,stop=stop)
+    _log(_render_output(channel,output),channel)
+    return output
+
+
+def _thread_run(target,channel,deadline,stop,*args):
+    """ Runs ``target`` for ``channel`` and returns its result with the
+    status and the elapsed time
+    """
+    start = time.time()
+    result = {'status':'PASS','output':'','error':''}
+    try:
+        result['output'] = target(channel,*args,deadline=deadline,stop=stop)
+    except Exception as err:
+        result['status'] = 'FAIL'
+        result['error'] = str(err)
+    result['time'] = time.time() - start
+    return result
+
+
+def _thread_init(channel):
+    """ Activates ENABLE mode and executes init commands of a channel that
+    is not registered yet. Used by the parallel `Connect All`
+    """
+    auth = channel['auth']
+    if 'secret' in auth:
+        secret_prompt = channel['secret-prompt']
+        _thread_cmd(channel,'')
+        output = _thread_cmd(channel,channel['secret-cmd'],
+                            prompt=r"%s|%s" % (secret_prompt,channel['prompt']))
+        if secret_prompt in output: _thread_cmd(channel,auth['secret'])
+
+    flag = Common.get_config_value('ignore-init-finish','vchannel',False)
+    if not flag and channel['init'] is not None:
+        for item in channel['init']:
+            _thread_cmd(channel,item)
+
+
+def _thread_connect(self,node,name,log_file,timeout,w,h):
+    """ Opens a session to ``node`` and returns the channel info with
+    the elapsed time
+    """
+    start = time.time()
+    channel_info = self._connect(node,name,log_file,timeout,w,h,register=False)
+    return channel_info,time.time() - start
+
+
+def _get_fileno(conn):
+    """ Returns a selectable file descriptor of the current session of
+    ``conn`` (a Telnet or SSHLibrary instance) or ``None`` if it is not
+    available
+    """
+    try:
+        if hasattr(conn,'_conn'):
+            # robot Telnet library, the connection is a telnetlib.Telnet
+            return conn._conn.fileno()
+        # SSHLibrary, paramiko channel of the interactive shell
+        return conn.current.shell._shell.fileno()
+    except Exception:
+        return None
+
+
+def _wait_readable(fd,timeout):
+    """ Waits until ``fd`` is readable or ``timeout`` seconds passed
+
+    When ``fd`` is ``None``, falls back to a short sleep and always returns
+    ``True``
+    """
+    if fd is None:
+        time.sleep(min(timeout,0.05))
+        return True
+    readable,_,_ = select.select([fd],[],[],timeout)
+    return len(readable) > 0
+
+
+_REGEX_CACHE_SIZE = 256
+
+def _get_regex(channel,pattern,flags=0):
+    """ Returns the compiled regex of ``pattern`` from the cache of ``channel``
+
+    The cache is kept in ``channel['regex']`` and keyed by the pattern and its
+    flags. It holds the prompt, the ``match_err`` and any pattern that is
+    overridden per call, so the command path never compiles a pattern twice.
+    A compiled pattern is returned as is.
+    """
+    if not isinstance(pattern,str): return pattern
+    cache = channel.setdefault('regex',{})
+    key = (pattern,flags)
+    regex = cache.get(key)
+    if regex is None:
+        if len(cache) >= _REGEX_CACHE_SIZE: cache.clear()
+        regex = cache[key] = re.compile(pattern,flags)
+    return regex
+
+
+def _read_until(channel,pattern=None,timeout=1.0,error_on_timeout=False,quiet=0.2,sink=None,stop=None):
+    """ Reads from ``channel`` until ``pattern`` matches the output
+
+    The function sleeps on the session's socket and wakes up as soon as data
+    arrives. Only a rolling tail of the output (``read-tail-size`` chars in
+    ``vchannel`` config) is matched against ``pattern`` so the cost of each
+    check does not grow with the output size.
+
+    When ``pattern`` is ``None``, the function returns after the session has
+    been quiet for ``quiet`` seconds since the last data.
+
+    When ``timeout`` seconds have passed without any match, the function
+    raises an error if ``error_on_timeout`` is ``True`` or returns what it
+    has read so far.
+
+    Raw data is returned, neither logged nor fed into the virtual terminal.
+    When ``sink`` is a function, each chunk of data is passed to it instead of
+    being kept and a null string is returned.
+
+    When ``stop`` (an event) is set, the function raises an error. The event
+    is checked at least every 0.2 seconds.
+    """
+    conn = channel['connection']
+    regex = _get_regex(channel,pattern) if pattern else None
+    tail_size = int(Common.get_config_value('read-tail-size','vchannel',4096))
+    fd = _get_fileno(conn)
+    deadline = time.time() + timeout
+    chunks = []
+    received = False
+    tail = ''
+    while True:
+        data = conn.read()
+        if data:
+            received = True
+            if sink is None:
+                chunks.append(data)
+            else:
+                sink(data)
+            tail = (tail + data)[-tail_size:]
+            if regex is not None and regex.search(tail):
+                return ''.join(chunks)
+        remaining = deadline - time.time()
+        if remaining <= 0: break
+        if stop is not None and stop.is_set():
+            raise Exception("ERR: stopped while waiting for `%s`" % getattr(regex,'pattern',pattern))
+        wait = remaining if stop is None else min(remaining,0.2)
+        if regex is None and received:
+            if not _wait_readable(fd,min(quiet,remaining)):
+                return ''.join(chunks)
+        elif not _wait_readable(fd,wait):
+            if stop is None: break
+        elif not data:
+            # readable but nothing decoded yet, avoid spinning
+            time.sleep(0.01)
+
+    if error_on_timeout:
+        raise AssertionError("No match found for `%s` in %s seconds" % (getattr(regex,'pattern',pattern),timeout))
+    return ''.join(chunks)
+
+
+# escape sequences: CSI, OSC, charset selection and other 2 chars sequences
+_ESC_SEQ = re.compile(r'\x1b(\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(\x07|\x1b\\)|[()][0-9A-Za-z]|[@-Z\\-_=>])')
+# an escape sequence that is not completed at the end of a chunk, a newline
+# ends an unterminated OSC
+_ESC_PARTIAL = re.compile(r'\x1b(\[[0-?]*[ -/]*|\][^\x07\x1b\n]*|[()])?$')
+# an incompleted sequence longer than this is processed as text
+_ESC_PENDING_MAX = 512
+# control chars that are dropped after processing \r and \b
+_CTRL_CHAR = re.compile(r'[\x00-\x07\x0b-\x1f\x7f]')
+
+
+def _render_line(line):
+    """ Applies carriage return and backspace in ``line`` like a terminal
+    """
+    if '\x08' in line:
+        buf = []
+        for c in line:
+            if c == '\x08':
+                if buf: buf.pop()
+            else:
+                buf.append(c)
+        line = ''.join(buf)
+    if '\r' in line:
+        buf = ''
+        for seg in line.split('\r'):
+            buf = seg + buf[len(seg):]
+        line = buf
+    return _CTRL_CHAR.sub('',line).rstrip()
+
+
+def _filter_output(channel,data,state=None):
+    """ Converts raw ``data`` of ``channel`` to plain text without a virtual
+    terminal
+
+    Escape sequences are stripped in a streaming way, an incompleted sequence
+    at the end of ``data`` is kept in ``state`` (default is the channel) and
+    processed with the next data unless it is longer than
+    ``_ESC_PENDING_MAX``. Lines are separated by ``newline`` of global
+    configuration.
+    """
+    if state is None: state = channel
+    data = state['esc-pending'] + data
+    m = _ESC_PARTIAL.search(data)
+    if m and len(data) - m.start() <= _ESC_PENDING_MAX:
+        state['esc-pending'] = data[m.start():]
+        data = data[:m.start()]
+    else:
+        state['esc-pending'] = ''
+    if data == '': return ''
+    data = _ESC_SEQ.sub('',data)
+    return Common.newline.join(_render_line(line) for line in data.split('\n'))
+
+
+def _dump_channel_screen(channel):
+    """ Returns all the content of the virtual terminal of ``channel``
+    including its history
+    """
+    screen = channel['screen']
+    history = Common.newline.join(''.join(c.data for c in list(row.values())).rstrip() for row in screen.history.top)
+    display = Common.newline.join(row.rstrip() for row in screen.display).rstrip(Common.newline)
+    return history + Common.newline + display
+
+
+def _render_output(channel,data):
+    """ Converts raw ``data`` read from ``channel`` to the text that is logged
+
+    When ``fast-read`` is enabled, the virtual terminal is only used in
+    ``screen mode``. In ``normal mode``, escape sequences are stripped from
+    ``data`` directly. Both ways end with a newline.
+    """
+    if channel['fast-read'] and not channel['screen_mode']:
+        return _filter_output(channel,data).rstrip(Common.newline) + Common.newline
+
+    # feed the data from session to the terminal stream
+    channel['stream'].feed(data)
+    try:
+        # dump all the screen including its history
+        output = _dump_channel_screen(channel) + Common.newline
+        channel['screen'].reset()
+    except UnicodeDecodeError as err:
+        output = err.args[1].decode('utf-8','replace')
+    return output
+
+
+# errors checked by `Cmd` when ``cmd-auto-check`` is enabled
+_CMD_MATCH_ERR = '\r\n(unknown command.|syntax error, expecting <command>.)\r\n'
+
+
+def _cmd_error(cmd,err_mat,output):
+    """ Logs and raises the error found in the ``output`` of ``cmd``
+    """
+    err_msg = (
+        "ERROR: Error encountered while execututing command - '{c}'" \
+        "\n    - {m}".format(
+            c=cmd, m=err_mat
+        )
+    )
+    BuiltIn().log(err_msg)
+    BuiltIn().log(output)
+    raise Exception(err_msg)
+
+
+class _LogWriter(threading.Thread):
+    """ A background thread that writes buffered channel logs to files
+
+    The thread wakes up every ``interval`` seconds or when a logger's buffer
+    is full and drains all registered loggers.
+    """
+    def __init__(self,interval):
+        super(_LogWriter,self).__init__(name='vchannel-log-writer')
+        self.daemon = True
+        self._interval = interval
+        self._loggers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def register(self,logger):
+        with self._lock: self._loggers.add(logger)
+
+    def unregister(self,logger):
+        with self._lock: self._loggers.discard(logger)
+
+    def wakeup(self):
+        self._wakeup.set()
+
+    def drain_all(self):
+        with self._lock: loggers = list(self._loggers)
+        for logger in loggers:
+            try:
+                logger.drain()
+            except Exception:
+                # the logger might be closed meanwhile
+                pass
+
+    def run(self):
+        while True:
+            self._wakeup.wait(self._interval)
+            self._wakeup.clear()
+            self.drain_all()
+
+
+class _AsyncLogger(object):
+    """ A file-like channel logger that keeps messages in a memory buffer
+
+    Messages are written to the file by the shared `_LogWriter` thread.
+    ``flush`` does nothing, use ``drain`` to write the buffer immediately.
+    When the buffer grows over 4 times of ``max_size`` because the writer
+    could not catch up, the caller drains the buffer by itself.
+    """
+    def __init__(self,path,mode,writer,max_size):
+        self._file = codecs.open(path,mode,'utf-8')
+        self._buffer = collections.deque()
+        self._size = 0
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._writer = writer
+        writer.register(self)
+
+    def write(self,msg):
+        with self._lock:
+            self._buffer.append(msg)
+            self._size += len(msg)
+            size = self._size
+        if size > 4 * self._max_size:
+            self.drain()
+        elif size >= self._max_size:
+            self._writer.wakeup()
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        with self._file_lock:
+            with self._lock:
+                data = ''.join(self._buffer)
+                self._buffer.clear()
+                self._size = 0
+            if data:
+                self._file.write(data)
+                self._file.flush()
+
+    def close(self):
+        self._writer.unregister(self)
+        self.drain()
+        self._file.close()
+
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+def _get_log_writer():
+    """ Returns the shared log writer thread and starts it if necessary
+    """
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is None:
+            interval = DateTime.convert_time(Common.get_config_value('log-flush-interval','vchannel','1s'))
+            _log_writer = _LogWriter(interval)
+            _log_writer.start()
+            atexit.register(_log_writer.drain_all)
+    return _log_writer
+
+
+def _open_log(path,mode):
+    """ Opens a channel log file. The logger is buffered and written by a
+    background thread when ``async-log`` is enabled in ``vchannel``
+    configuration
+    """
+    if Common.get_config_value('async-log','vchannel',False):
+        max_size = int(Common.get_config_value('log-buffer-size','vchannel',65536))
+        return _AsyncLogger(path,mode,_get_log_writer(),max_size)
+    return codecs.open(path,mode,'utf-8')
+
+
+def _drain_log(logger):
+    """ Writes everything remained in ``logger`` to its file
+    """
+    if hasattr(logger,'drain'):
+        logger.drain()
+    else:
+        logger.flush()
+
+
+def _close_session(entry):
+    """ Closes a pooled session quietly
+    """
+    try:
+        entry['connection'].close_all_connections()
+    except Exception:
+        pass
+
+
+def _check_session(entry):
+    """ Checks if a pooled session still responses with its prompt
+    """
+    wait = DateTime.convert_time(Common.get_config_value('session-check-timeout','vchannel','5s'))
+    try:
+        entry['connection'].read()
+        entry['connection'].write_bare("\r")
+        _read_until(entry,entry['prompt'],wait,error_on_timeout=True)
+        return True
+    except Exception:
+        return False
+
+
+class _SessionPool(object):
+    """ A process-level pool of authenticated sessions
+
+    When ``keep-session`` is enabled in ``vchannel`` configuration, closed
+    channels park their sessions here instead of logging out and the next
+    connection with the same key (ip, port, access, auth profile, user and
+    device type) reuses the session without login. Sessions idle longer than
+    ``session-idle-timeout`` are closed, all sessions are closed at process
+    exit.
+    """
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        atexit.register(self.clear)
+
+    def _evict(self):
+        """ Removes and returns idle sessions, must be called with the lock
+        """
+        idle = DateTime.convert_time(Common.get_config_value('session-idle-timeout','vchannel','10m'))
+        now = time.time()
+        expired = []
+        for key in list(self._sessions):
+            alive = []
+            for item in self._sessions[key]:
+                if now - item[0] > idle:
+                    expired.append(item[1])
+                else:
+                    alive.append(item)
+            if alive:
+                self._sessions[key] = alive
+            else:
+                del self._sessions[key]
+        return expired
+
+    def acquire(self,key):
+        """ Returns a healthy session for ``key`` or ``None``
+        """
+        while True:
+            with self._lock:
+                expired = self._evict()
+                items = self._sessions.get(key)
+                entry = items.pop()[1] if items else None
+            for item in expired: _close_session(item)
+            if entry is None or _check_session(entry):
+                return entry
+            _close_session(entry)
+
+    def release(self,key,entry):
+        with self._lock:
+            self._sessions.setdefault(key,[]).append((time.time(),entry))
+            expired = self._evict()
+        for item in expired: _close_session(item)
+
+    def clear(self):
+        with self._lock:
+            entries = [ item[1] for items in self._sessions.values() for item in items ]
+            self._sessions = {}
+        for entry in entries: _close_session(entry)
+
+
+_session_pool = _SessionPool()
+
+# SFTP sessions for file transfer, keyed by (ip,user)
+_sftp_pool = {}
+_sftp_lock = threading.Lock()
+# size and modification time of the source of unfinished transfers
+_sftp_parts = {}
+
+
+def _sftp_open(channel,timeout=30):
+    """ Returns a tuple of the own SSH session (or ``None``), the SFTP client
+    and the SSH transport to the node of ``channel``
+
+    A pooled session is used first. Otherwise the SSH transport of the channel
+    is reused when the channel is a direct SSH session, or a new SSH session
+    is opened with the authentication of the channel. When the node refuses
+    the SFTP subsystem (e.g. JunOS without ``sftp-server``), the SFTP client is
+    ``None`` and files are copied by SCP on the same transport. The tuple
+    should be given back by `_sftp_release`.
+    """
+    key = (channel['ip'],channel['auth']['user'])
+    with _sftp_lock:
+        items = _sftp_pool.get(key)
+        item = items.pop() if items else None
+    if item is not None:
+        ssh,sftp,transport = item
+        if transport.is_active() and (sftp is None or not sftp.get_channel().closed):
+            return item
+        _sftp_close(item)
+
+    ssh = None
+    transport = None
+    if channel.get('access') == 'ssh':
+        try:
+            transport = channel['connection'].current.client.get_transport()
+        except Exception:
+            transport = None
+    if transport is None or not transport.is_active():
+        auth = channel['auth']
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        if 'key' in auth:
+            ssh.connect(channel['ip'],username=auth['user'],key_filename=auth['key'],
+                        passphrase=auth.get('pass'),timeout=timeout,allow_agent=False)
+        else:
+            ssh.connect(channel['ip'],username=auth['user'],password=auth['pass'],
+                        timeout=timeout,look_for_keys=False,allow_agent=False)
+        transport = ssh.get_transport()
+    try:
+        sftp = paramiko.SFTPClient.from_transport(transport)
+    except (EOFError,SSHException):
+        sftp = None
+    return (ssh,sftp,transport)
+
+
+def _sftp_release(channel,item):
+    """ Gives back the tuple ``item`` of ``channel`` to the pool
+    """
+    key = (channel['ip'],channel['auth']['user'])
+    with _sftp_lock:
+        _sftp_pool.setdefault(key,[]).append(item)
+
+
+def _sftp_close(item):
+    """ Closes the SFTP client of ``item`` and its own SSH session
+    """
+    ssh,sftp,transport = item
+    try:
+        if sftp is not None: sftp.close()
+        if ssh is not None: ssh.close()
+    except Exception:
+        pass
+
+
+def _sftp_reset(channel):
+    """ Closes all pooled SFTP sessions to the node of ``channel``
+
+    Used when the SSH service of the node is removed or the channel is closed.
+    """
+    with _sftp_lock:
+        items = _sftp_pool.pop((channel['ip'],channel['auth']['user']),[])
+    for item in items: _sftp_close(item)
+
+
+def _sftp_clear():
+    """ Closes all pooled SFTP sessions
+    """
+    with _sftp_lock:
+        items = [item for items in _sftp_pool.values() for item in items]
+        _sftp_pool.clear()
+    for item in items: _sftp_close(item)
+
+
+atexit.register(_sftp_clear)
+
+
+def _sftp_put(sftp,src,dst,resume,chunk,window):
+    """ Uploads local ``src`` to ``dst`` of the node and returns the size and
+    the offset where the transfer started
+    """
+    size = os.path.getsize(src)
+    part = dst + '.part'
+    offset = 0
+    if resume:
+        try:
+            offset = sftp.stat(part).st_size
+        except IOError:
+            offset = 0
+        if offset > size: offset = 0
+    with open(src,'rb') as f, sftp.open(part,'r+b' if offset > 0 else 'wb') as rf:
+        rf.seek(offset)
+        f.seek(offset)
+        # writes are not acknowledged one by one, but every ``window`` chunks
+        count = 0
+        for data in iter(lambda: f.read(chunk),b''):
+            count += 1
+            rf.set_pipelined(count % window != 0)
+            rf.write(data)
+    try:
+        sftp.posix_rename(part,dst)
+    except IOError:
+        try:
+            sftp.remove(dst)
+        except IOError:
+            pass
+        sftp.rename(part,dst)
+    return size,offset
+
+
+def _sftp_get(sftp,src,dst,resume,chunk,window):
+    """ Downloads ``src`` of the node to local ``dst`` and returns the size and
+    the offset where the transfer started
+    """
+    size = sftp.stat(src).st_size
+    part = dst + '.part'
+    offset = 0
+    if resume and os.path.exists(part):
+        offset = os.path.getsize(part)
+        if offset > size: offset = 0
+    with sftp.open(src,'rb') as rf, open(part,'r+b' if offset > 0 else 'wb') as f:
+        rf.seek(offset)
+        f.seek(offset)
+        # at most ``window`` read requests are on the fly
+        try:
+            rf.prefetch(size,max_concurrent_requests=window)
+        except TypeError:
+            rf.prefetch(size)
+        for data in iter(lambda: rf.read(chunk),b''):
+            f.write(data)
+    os.replace(part,dst)
+    return size,offset
+
+
+def _scp_ack(chan):
+    """ Reads the SCP response and raises an error when it is not OK
+    """
+    code = chan.recv(1)
+    if code == b'\x00': return
+    msg = b''
+    while not msg.endswith(b'\n'):
+        data = chan.recv(1)
+        if not data: break
+        msg += data
+    raise IOError("SCP error: %s" % (msg.decode('utf-8','replace').strip() or 'connection closed'))
+
+
+def _scp_quote(path):
+    """ Quotes ``path`` for the remote shell
+    """
+    return "'%s'" % path.replace("'","'\"'\"'")
+
+
+def _scp_put(transport,src,dst,chunk,timeout=None):
+    """ Uploads local ``src`` to ``dst`` of the node by SCP and returns the
+    size and the offset (always 0)
+    """
+    size = os.path.getsize(src)
+    chan = transport.open_session()
+    chan.settimeout(timeout)
+    try:
+        chan.exec_command('scp -t %s' % _scp_quote(dst))
+        _scp_ack(chan)
+        chan.sendall(('C0644 %d %s\n' % (size,os.path.basename(dst))).encode('utf-8'))
+        _scp_ack(chan)
+        with open(src,'rb') as f:
+            for data in iter(lambda: f.read(chunk),b''): chan.sendall(data)
+        chan.sendall(b'\x00')
+        _scp_ack(chan)
+    finally:
+        chan.close()
+    return size,0
+
+
+def _scp_get(transport,src,dst,chunk,timeout=None):
+    """ Downloads ``src`` of the node to local ``dst`` by SCP and returns the
+    size and the offset (always 0)
+    """
+    part = dst + '.part'
+    chan = transport.open_session()
+    chan.settimeout(timeout)
+    try:
+        chan.exec_command('scp -f %s' % _scp_quote(src))
+        chan.sendall(b'\x00')
+        header = b''
+        while not header.endswith(b'\n'):
+            data = chan.recv(1)
+            if not data: raise IOError("SCP error: connection closed")
+            header += data
+        if not header.startswith(b'C'):
+            raise IOError("SCP error: %s" % header[1:].decode('utf-8','replace').strip())
+        size = int(header.split()[1])
+        chan.sendall(b'\x00')
+        remain = size
+        with open(part,'wb') as f:
+            while remain > 0:
+                data = chan.recv(min(chunk,remain))
+                if not data: raise IOError("SCP error: connection closed")
+                f.write(data)
+                remain -= len(data)
+        _scp_ack(chan)
+        chan.sendall(b'\x00')
+    finally:
+        chan.close()
+    os.replace(part,dst)
+    return size,0
+
+
+def _sftp_transfer(channel,direction,local_path,remote_path,resume=True,checksum=None,timeout=None):
+    """ Copies ``local_path`` to ``remote_path`` of the node (``put``) or
+    ``remote_path`` of the node to ``local_path`` (``get``) by SFTP
+
+    Data is written to ``<path>.part`` first and renamed when the transfer
+    finishes. When the connection is broken, the transfer is retried
+    ``transfer-retry`` times. With ``resume``, a partial file is continued
+    only when it was left by a transfer of the same source (same size and
+    modification time), otherwise the transfer starts from the beginning.
+    When the node does not provide SFTP, the file is copied by SCP without
+    resume.
+
+    ``checksum`` is a function that returns the MD5 of a file on the node. When
+    it is defined, the file is verified with `Common.File MD5` and copied
+    again from the beginning if the hashes are different.
+
+    Returns a dictionary with ``size``, ``offset`` (where the last transfer
+    started), ``bytes`` (transferred bytes), ``time``, ``rate`` (bytes per
+    second) and ``method`` (``sftp`` or ``scp``).
+    """
+    chunk   = int(Common.get_config_value('transfer-chunk-size','vchannel',32768))
+    window  = int(Common.get_config_value('transfer-window','vchannel',64))
+    retry   = int(Common.get_config_value('transfer-retry','vchannel',2))
+    part_key = (channel['ip'],channel['auth']['user'],direction,local_path,remote_path)
+    start   = time.time()
+    sent    = 0
+    for i in range(retry + 1):
+        item = _sftp_open(channel)
+        ssh,sftp,transport = item
+        try:
+            if sftp is None:
+                if direction == 'put':
+                    size,offset = _scp_put(transport,local_path,remote_path,chunk,timeout)
+                else:
+                    size,offset = _scp_get(transport,remote_path,local_path,chunk,timeout)
+            else:
+                if timeout is not None: sftp.get_channel().settimeout(timeout)
+                if direction == 'put':
+                    stat = os.stat(local_path)
+                else:
+                    stat = sftp.stat(remote_path)
+                source = (stat.st_size,int(stat.st_mtime))
+                with _sftp_lock:
+                    can_resume = resume and _sftp_parts.get(part_key) == source
+                    _sftp_parts[part_key] = source
+                if direction == 'put':
+                    size,offset = _sftp_put(sftp,local_path,remote_path,can_resume,chunk,window)
+                else:
+                    size,offset = _sftp_get(sftp,remote_path,local_path,can_resume,chunk,window)
+                with _sftp_lock: _sftp_parts.pop(part_key,None)
+        except (EOFError,socket.timeout,SSHException) as err:
+            _sftp_close(item)
+            if i == retry:
+                raise Exception("ERR: could not %s `%s` after %d retries: %s" % (direction,remote_path,retry,err))
+            continue
+        except Exception:
+            _sftp_close(item)
+            raise
+        if sftp is not None and timeout is not None: sftp.get_channel().settimeout(None)
+        _sftp_release(channel,item)
+        sent += size - offset
+
+        if checksum is None: break
+        local_md5   = Common.file_md5(local_path)
+        remote_md5  = checksum(remote_path)
+        if local_md5 == remote_md5: break
+        if i == retry:
+            raise Exception("ERR: MD5 of `%s`(%s) and `%s`(%s) are different" % (local_path,local_md5,remote_path,remote_md5))
+        resume = False
+
+    elapsed = max(time.time() - start,0.001)
+    return {'size':size,'offset':offset,'bytes':sent,'time':elapsed,'rate':sent / elapsed,
+            'method':'scp' if sftp is None else 'sftp'}
 
 
 def _log(msg,channel):
@@ -177,6 +960,13 @@ class VChannel(object):
     node, remove it from the global variable ``LOCAL['node']`` and ``NODE`` and keep
     running the test.
 
+    When ``keep-session`` is ``yes`` in ``vchannel`` configuration, `Close`
+    does not log out but keeps the session in a process-level pool. Later
+    `Connect` to the same device with the same credentials (for example from
+    the next suite in the same ``robot`` run) reuses that session after a
+    prompt check, without login and init commands. Sessions that are idle
+    longer than ``session-idle-timeout`` are closed.
+
     """
 
     ROBOT_LIBRARY_SCOPE = 'TEST SUITE'
@@ -334,7 +1124,8 @@ class VChannel(object):
                  w=None,
                  h=None,
                  mode='w', profile=None,
-                 username=None, password=None):
+                 username=None, password=None,
+                 register=True):
         """ Connects to the node and create a VChannel instance
 
         Login information is automatically extracted from yaml configuration.
@@ -352,6 +1143,11 @@ class VChannel(object):
         User can specify a username/password on connect which will override
         any values specified in ${RENAT_PATH}/config/auth.yaml for the session.
 
+        When ``register`` is ``False``, the session is opened and initialized
+        but the channel is not registered. The channel info is returned instead
+        of the channel id and any error is raised to the caller. This is used by
+        the parallel mode of `Connect All`.
+
         Examples:
         | `Connect` | vmx11 | vmx11 | vmx11.log |
         | `Connect` | vmx11 | vmx11 | vmx11.log | 80 | 64 |
@@ -430,8 +1226,11 @@ class VChannel(object):
             _access_tmpl.get('secret-cmd') or \
             'enable'
         _timeout = timeout
+        _read_mode = Common.get_config_value('read-mode','vchannel','sleep')
     
-        if _access_tmpl.get('disable-achannel') is True:
+        # in parallel bring-up, the caller disables the async channel
+        _disable_achannel = _access_tmpl.get('disable-achannel') is True
+        if _disable_achannel and register:
             self._async_channel = None
             BuiltIn().log('AChannel Disabled by access template')
 
@@ -448,10 +1247,26 @@ class VChannel(object):
 
         channel_info = {}
 
+        # reuse an authenticated session from the pool
+        _keep_session = Common.get_config_value('keep-session','vchannel',False)
+        _session = None
+        if _keep_session:
+            _pool_key = (_ip,_port,_access,_auth_type,_profile,_auth.get('user'),_type)
+            channel_info['pool-key'] = _pool_key
+            _session = _session_pool.acquire(_pool_key)
+
         try:
+            if _session is not None:
+                BuiltIn().log("Reuse a pooled session for `%s(%s)`" % (node,_ip))
+                channel_info.update(_session)
+                _prompt = _session['prompt']
+                _auth   = _session['auth']
+                _finish = _session['finish']
+                output  = ""
+
             ### TELNET section
             ### _login_prompt could be None but not the _pass_prompt
-            if _access == 'telnet':
+            if _access == 'telnet' and _session is None:
                 _port = _port or 23
                 _telnet = Telnet(timeout='3m')
                 output = ""
@@ -482,17 +1297,14 @@ class VChannel(object):
                     output += _telnet.read()
                     BuiltIn().log(output)
 
-                # allocate new channel id
-                id = self._max_id + 1
                 # channel_info['access-type'] = 'telnet'
-                channel_info['id']          = id
                 channel_info['type']        = _type
                 channel_info['prompt']      = _prompt
                 channel_info['connection']  = _telnet
                 channel_info['local-id']    = local_id
 
             ### SSH
-            if _access == 'ssh':
+            if _access == 'ssh' and _session is None:
                 _port   = _port or 22
                 _ssh    = SSHLibrary.SSHLibrary(timeout='3m')
                 output  = ""
@@ -516,9 +1328,6 @@ class VChannel(object):
                     pass_phrase = _auth.get('pass')
                     output      = _ssh.login_with_public_key(_auth['user'],_auth['key'],pass_phrase)
 
-                # allocate new channel id
-                id = self._max_id + 1
-                channel_info['id']          = id
                 channel_info['type']        = _type
                 # channel_info['access-type'] = 'ssh'
                 channel_info['prompt']      = _prompt
@@ -526,9 +1335,10 @@ class VChannel(object):
                 channel_info['local-id']    = local_id
 
             ### JUMP session
-            if _access == 'jump':
+            if _access == 'jump' and _session is None:
                 # because console is only allow 1 session, for async mode off
-                self._async_channel = None
+                _disable_achannel = True
+                if register: self._async_channel = None
 
                 output = ""
                 _access_base = _access_tmpl['access-base']
@@ -618,9 +1428,7 @@ class VChannel(object):
                     # channel_info['access-type'] = 'ssh'
                     channel_info['connection']  = _ssh
 
-                # allocate new channel id for target device, common for jump access type
-                id = self._max_id + 1
-                channel_info['id']  = id
+                # common for jump access type
                 channel_info['type'] = _type
                 channel_info['prompt']  = _prompt
                 channel_info['local-id'] = local_id
@@ -634,8 +1442,11 @@ class VChannel(object):
                     BuiltIn().log("Execute %d jump commands" % len(_device_info['jump-cmd']))
                     for item in _device_info['jump-cmd']:
                         channel_info['connection'].write(str(item)+'\r')
-                        time.sleep(2)
-                        output = channel_info['connection'].read()
+                        if _read_mode == 'event':
+                            output = _read_until(channel_info,None,2)
+                        else:
+                            time.sleep(2)
+                            output = channel_info['connection'].read()
 
                 # at this point, the system is waiting for the second login
                 # phase. The status could be already login
@@ -670,15 +1481,24 @@ class VChannel(object):
                 BuiltIn().log("------------")
                 BuiltIn().log("--%s--" % output)
                 BuiltIn().log("------------")
+                # in event read mode, waits for the next login step instead
+                # of fixed sleeps
+                _step_prompt = '|'.join(item for item in (_login_prompt,_pass_prompt,_prompt) if item)
                 if re.search('Press RETURN to get started',output):
                     channel_info['connection'].write("\r")
-                    time.sleep(3)
+                    if _read_mode == 'event':
+                        output = _read_until(channel_info,_step_prompt,3)
+                    else:
+                        time.sleep(3)
 
                 if _login_prompt and re.search(_login_prompt,output):
                     BuiltIn().log("Login to target device with username `%s`" % _auth['user'])
                     channel_info['connection'].write(_auth['user'])
-                    time.sleep(3)
-                    output = channel_info['connection'].read()
+                    if _read_mode == 'event':
+                        output = _read_until(channel_info,_pass_prompt or _prompt,3)
+                    else:
+                        time.sleep(3)
+                        output = channel_info['connection'].read()
                     BuiltIn().log("------------")
                     BuiltIn().log("--%s--" % output)
                     BuiltIn().log("------------")
@@ -686,14 +1506,21 @@ class VChannel(object):
                 if _pass_prompt and re.search(_pass_prompt,output):
                     BuiltIn().log("Login to target device with password `%s`" % _auth['pass'])
                     channel_info['connection'].write(_auth['pass'])
-                    time.sleep(3)
+                    if _read_mode == 'event':
+                        _read_until(channel_info,_prompt,3)
+                    else:
+                        time.sleep(3)
 
                 BuiltIn().log("Waiting for the 1st prompt ...")
                 channel_info['connection'].write("\r")
-                time.sleep(3)
-                channel_info['connection'].write("\r")
-                time.sleep(1)
-                channel_info['connection'].read_until_regexp(_prompt)
+                if _read_mode == 'event':
+                    _wait = DateTime.convert_time(_timeout) if _timeout else 180
+                    _read_until(channel_info,_prompt,_wait,error_on_timeout=True)
+                else:
+                    time.sleep(3)
+                    channel_info['connection'].write("\r")
+                    time.sleep(1)
+                    channel_info['connection'].read_until_regexp(_prompt)
                 BuiltIn().log("Got the 1st prompt as expected")
 
             # common for all access type
@@ -701,7 +1528,7 @@ class VChannel(object):
             result_folder = Common.get_result_folder()
 
             _log_file  = self._aprefix + log_file
-            channel_info['logger']  = codecs.open(result_folder + '/' + _log_file,mode,'utf-8')
+            channel_info['logger']  = _open_log(result_folder + '/' + _log_file,mode)
 
             # common channel info
             channel_info['node']        = node
@@ -713,12 +1540,21 @@ class VChannel(object):
             channel_info['timeout']     = _timeout
             channel_info['auth']        = _auth
             channel_info['ip']          = _ip
+            channel_info['access']      = _access
             channel_info['separator']   = ""
             channel_info['finish']      = _finish
             channel_info['timeout']     = timeout
+            channel_info['read-mode']   = _read_mode
+            if _keep_session:
+                channel_info['pool-prompt'] = channel_info['prompt']
             #
             channel_info['screen_mode'] = False
-            channel_info['screen'] = pyte.HistoryScreen(w,h,100000)
+            channel_info['fast-read']   = Common.get_config_value('fast-read','vchannel',False)
+            channel_info['esc-pending'] = ''
+            channel_info['regex']       = {}
+            _get_regex(channel_info,channel_info['prompt'])
+            history = int(Common.get_config_value('screen-history','vchannel',100000))
+            channel_info['screen'] = pyte.HistoryScreen(w,h,history)
             channel_info['stream'] = pyte.Stream(channel_info['screen'])
             # handle different version of pyte
             try:
@@ -726,24 +1562,26 @@ class VChannel(object):
             except:
                 channel_info['screen'].define_charset('B', '(')
 
-            self._current_id            = id
-            self._max_id                = id
-            self._current_name          = name
+            # in parallel bring-up, the session is initialized here and the
+            # channel is registered later by the caller
+            if not register:
+                channel_info['init']            = _init
+                channel_info['secret-cmd']      = _secret_cmd
+                channel_info['secret-prompt']   = _secret_prompt
+                channel_info['disable-achannel'] = _disable_achannel
+                _log(output,channel_info)
+                if _session is None: _thread_init(channel_info)
+                return channel_info
 
-            # remember this info by name(alias)
-            self._channels[name]   = channel_info
-            self._backup_channels[name] = channel_info
+            id = self._add_channel(channel_info,output)
 
-            # by default switch to the connected device
-            self._switch(name)
-
-            # logging the authentication process until now
-            BuiltIn().log(output)
-            self.log(output)
+            # a pooled session has been initialized already
+            if _session is not None:
+                _init = None
 
             # activate ENABLE mode
             # the device might bi in ENABLE mode already
-            if 'secret' in _auth:
+            if 'secret' in _auth and _session is None:
                 BuiltIn().log("Entering ENABLE mode")
                 self._cmd()
                 output = self._cmd(_secret_cmd,prompt=r"%s|%s" % (_secret_prompt,_prompt))
@@ -758,6 +1596,12 @@ class VChannel(object):
 
             BuiltIn().log("Opened connection to `%s(%s)`" % (self._aprefix+name,_ip))
         except Exception as err:
+            if not register:
+                # the channel is not registered, so `Close All` could not
+                # close what was opened here
+                if 'logger' in channel_info: channel_info['logger'].close()
+                if 'connection' in channel_info: _close_session(channel_info)
+                raise
             if not ignore_dead_node:
                 err_msg = "ERROR: Error occured when connecting to `%s(%s)`" % (self._aprefix + name,_ip)
                 BuiltIn().log(err)
@@ -770,27 +1614,131 @@ class VChannel(object):
         return id
 
 
+    def _add_channel(self,channel_info,output=None):
+        """ Allocates a new id for an opened session, registers it as the
+        current channel and logs the authentication ``output`` if it is not
+        ``None``
+
+        Returns the new channel id
+        """
+        name = channel_info['name']
+        id = self._max_id + 1
+        channel_info['id']          = id
+
+        self._current_id            = id
+        self._max_id                = id
+        self._current_name          = name
+
+        # remember this info by name(alias)
+        self._channels[name]   = channel_info
+        self._backup_channels[name] = channel_info
+
+        # by default switch to the connected device
+        self._switch(name)
+
+        # logging the authentication process until now
+        if output is not None:
+            BuiltIn().log(output)
+            self.log(output)
+        return id
+
+
+    def _connect_parallel(self,node_list,timeout,w,h,worker):
+        """ Opens sessions to all nodes in ``node_list`` by ``worker``
+        threads.
+
+        ``node_list`` is a list of (node,log_file). Channels are registered in
+        the order of ``node_list`` after all sessions have been opened, so the
+        channel ids are the same as the serial mode.
+
+        Returns a dictionary of elapsed time (in seconds) for each node
+        """
+        ignore_dead_node = Common.get_config_value('ignore-dead-node')
+        result = {}
+        with ThreadPoolExecutor(max_workers=worker) as executor:
+            futures = [ (node,executor.submit(_thread_connect,self,node,node,log_file,timeout,w,h))
+                        for node,log_file in node_list ]
+        # register all opened sessions before raising any error so that they
+        # could be closed by `Close All`
+        error = None
+        for node,future in futures:
+            try:
+                channel_info,elapsed = future.result()
+            except Exception as err:
+                if not ignore_dead_node:
+                    err_msg = "ERROR: Error occured when connecting to `%s`" % (self._aprefix + node)
+                    BuiltIn().log(err)
+                    BuiltIn().log(err_msg,console=True)
+                    error = error or err
+                else:
+                    warn_msg = "WARN: Error occured when connect to `%s` but was ignored" % (self._aprefix + node)
+                    BuiltIn().log(warn_msg,console=True)
+                    del Common.LOCAL['node'][node]
+                continue
+            # set by the access template or a jump session
+            if channel_info.pop('disable-achannel') and self._async_channel is not None:
+                self._async_channel = None
+                BuiltIn().log('AChannel Disabled by `%s`' % node)
+            self._add_channel(channel_info)
+            result[node] = elapsed
+            BuiltIn().log("    Opened connection to `%s(%s)` in %.2f seconds" % (self._aprefix+node,channel_info['ip'],elapsed))
+        if error is not None: raise error
+        return result
+
+
     def connect_all(self):
         """ Connects to *all* nodes that are defined in active ``local.yaml``.
 
         A prefix ``prefix`` was appended to the alias name of the connection. A
         new log file by ``<alias>.log`` was automatiocally created.
 
+        When ``connect-worker`` in ``vchannel`` configuration is bigger than 1,
+        the nodes are logged in parallel by that number of threads. Login,
+        ENABLE mode and init commands are executed in parallel, channels are
+        registered in the order of ``local.yaml`` afterward. The keyword
+        returns a dictionary of the time (in seconds) that each node took to
+        connect.
+
+        Sample ``config.yaml`` or ``local.yaml``:
+        | vchannel:
+        |     connect-worker: 16
+
         See `Common` for more detail about active ``local.yaml``
         """
-
+        result = {}
         if 'node' in Common.LOCAL and not Common.LOCAL['node']:
             num = 0
         else:
             nodes = Common.LOCAL['node']
             num = len(nodes)
+            node_list = []
             for node_name in nodes:
                 if "log" in nodes[node_name]:
                     log_file = nodes[node_name]['log']
                 else:
                     log_file    = node_name + '.log'
-                self.connect(node_name,node_name,log_file)
+                node_list.append((node_name,log_file))
+
+            worker = int(Common.get_config_value('connect-worker','vchannel',1))
+            if worker > 1 and num > 1:
+                timeout = Common.get_config_value('terminal-timeout')
+                terminal_info = Common.get_config_value('terminal')
+                w = terminal_info['width']
+                h = terminal_info['height']
+                BuiltIn().log("Connect to %d nodes by %d workers" % (num,worker))
+                result = self._connect_parallel(node_list,timeout,w,h,worker)
+                if Common.get_config_value('async-channel', 'vchannel', False) and self._async_channel is not None:
+                    self._async_channel._connect_parallel(
+                        [ item for item in node_list if item[0] in result ],
+                        timeout,w,h,worker)
+            else:
+                for node_name,log_file in node_list:
+                    start = time.time()
+                    self.connect(node_name,node_name,log_file)
+                    if node_name in self._channels:
+                        result[node_name] = time.time() - start
         BuiltIn().log("Connected to all %s nodes defined in ``conf/local.yaml``" % (num))
+        return result
 
 
     ###
@@ -846,9 +1794,7 @@ class VChannel(object):
     def _dump_screen(self):
         """ dump all the content of the terminal's screen including its history
         """
-        channel = self.get_current_channel()
-        screen = channel['screen']
-        return  self._get_history() + self._get_screen()
+        return _dump_channel_screen(self.get_current_channel())
 
 
     def switch(self,name):
@@ -912,7 +1858,7 @@ class VChannel(object):
         channel['logger'].close()
 
         result_path = Common.get_result_path()
-        channel['logger'] = codecs.open(result_path+'/'+log_file,mode,'utf-8')
+        channel['logger'] = _open_log(result_path+'/'+log_file,mode)
         channel['log-file'] = log_file
 
         BuiltIn().log("Changed current log file to %s" % log_file)
@@ -947,6 +1893,10 @@ class VChannel(object):
         output`` after waiting `str_wait`. Otherwise, the keyword return
         without any output.
 
+        In ``normal mode``, when the channel read mode is ``event`` (see `Set
+        Read Mode`), the keyword returns as soon as the prompt appears and
+        `str_wait` (default is 1 second) is the maximum waiting time.
+
         *Notes:*  This is a non-blocking command.
 
         Examples:
@@ -984,7 +1934,11 @@ class VChannel(object):
             # by default, always add a `newline` to the cmd
             # channel['connection'].write_bare(cmd + Common.newline)
             channel['connection'].write_bare(cmd + "\r")
-            if wait > 0:
+            if channel['read-mode'] == 'event':
+                # returns as soon as the prompt appears
+                output = _read_until(channel,channel['prompt'],wait if wait > 0 else 1)
+                result = self._feed(channel,output)
+            elif wait > 0:
                 time.sleep(wait)
                 result = self.read()
             else:
@@ -1003,6 +1957,33 @@ class VChannel(object):
         return prompt
 
 
+    def set_read_mode(self,mode=u'sleep'):
+        """ Sets how the current channel waits for output and returns the
+        previous mode
+
+        - ``sleep``: `Write` sleeps a fixed time before reading and `Cmd`
+          uses the ``delay`` option as it is
+        - ``event``: `Write` and `Cmd` wake up whenever output arrives and
+          return as soon as the prompt appears
+
+        The default mode of new channels is ``read-mode`` in ``vchannel``
+        configuration. It is also used by the login sequence of ``jump``
+        access.
+
+        Example:
+        | ${mode}=                 | VChannel.`Set Read Mode` | event |
+        | VChannel.`Cmd`           | show route |
+        | VChannel.`Set Read Mode` | ${mode} |
+        """
+        if mode not in ('sleep','event'):
+            raise Exception("ERR: unknown read mode `%s`" % mode)
+        channel = self.get_current_channel()
+        old_mode = channel['read-mode']
+        channel['read-mode'] = mode
+        BuiltIn().log("Changed read mode of channel `%s` to `%s`" % (self._current_name,mode))
+        return old_mode
+
+
     def change_prompt(self,str_prompt):
         """ Changes the current prompt of the channel
 
@@ -1067,12 +2048,13 @@ class VChannel(object):
         else:
             last_prompt = '.*%s' % prompt
             cur_prompt = '.*(%s|%s)' % (prompt,wait_prompt)
+        last_regex = _get_regex(channel,'.*' + last_prompt,re.DOTALL)
         output = ''
         BuiltIn().log('prompt = %s' % cur_prompt)
         while True:
             output = channel['connection'].read_until_regexp(cur_prompt)
             self.log(output,channel)
-            if re.match('.*' + last_prompt,output,re.DOTALL): break
+            if last_regex.match(output): break
             BuiltIn().log('Continue...')
             self.write(' ')
             time.sleep(1)
@@ -1093,7 +2075,8 @@ class VChannel(object):
             timeout=None,error_on_timeout=True,
             remove_prompt=False,
             delay=u'0s',
-            match_err='\r\n(unknown command.|syntax error, expecting <command>.)\r\n'):
+            match_err=_CMD_MATCH_ERR,
+            output_file=None):
         """Executes a ``command`` and wait until for the prompt.
 
         This is a blocking keyword. Execution of the test case will be postponed until the prompt appears.
@@ -1113,6 +2096,10 @@ class VChannel(object):
         the command once,  read the output and wait for ``delay`` before repeat
         the read. This will be repeated until there is no more output.
 
+        When the channel read mode is ``event`` (see `Set Read Mode`),
+        ``delay`` is ignored. The keyword wakes up whenever output arrives and
+        returns as soon as the prompt matches the tail of the output.
+
         The keyword returns error when the output matches the ``match_err`` and
         the default config value `cmd-auto-check` is ``True``
 
@@ -1122,6 +2109,16 @@ class VChannel(object):
 
         Output will be automatically logged to the channel current log file.
 
+        When ``output_file`` is defined, the output is not kept in memory but
+        is written chunk by chunk to that file in the current result folder
+        (escape sequences are stripped) and ``match_err`` is checked while
+        reading. In this case the output is not written to the channel log
+        and the keyword returns a summary dictionary with following keys:
+        - ``file``: the absolute path of the file
+        - ``size``: number of written characters
+        - ``lines``: number of written lines
+        - ``error``: the first match of ``match_err`` or ``None``
+
  [./Common.html|Common] for details about the config files.
 
         Sample:
@@ -1129,8 +2126,9 @@ class VChannel(object):
         | Router.`Cmd`   | reload   | prompt=\\[yes/no\\]:${SPACE} | # reload a Cisco router |
         | Router.`Cmd`   | no       | prompt=\\[confirm\\] | [ is escaped twice |
         | Router.`Cmd`   | show configuration | display set |  delay=0.5s |
+        | ${summary}=    | Router.`Cmd` | show route extensive | output_file=route.txt |
         """
-        return self._cmd(cmd,prompt,timeout,error_on_timeout,remove_prompt,delay,match_err)
+        return self._cmd(cmd,prompt,timeout,error_on_timeout,remove_prompt,delay,match_err,output_file)
 
 
     @with_reconnect
@@ -1138,7 +2136,8 @@ class VChannel(object):
             timeout=None, error_on_timeout=True,
             remove_prompt=False,
             delay=u"0s",
-            match_err='\r\n(unknown command.|syntax error, expecting <command>.)\r\n'):
+            match_err=_CMD_MATCH_ERR,
+            output_file=None):
         """ Local command execution
         """
         BuiltIn().log("Execute command: `%s`" % (cmd))
@@ -1158,12 +2157,26 @@ class VChannel(object):
         # BuiltIn().log(cur_prompt)
         output = ''
 
+        # stream the output to file
+        if output_file:
+            cmd_auto_check = Common.get_config_value('cmd-auto-check')
+            summary = self._capture(channel,cur_prompt,timeout,error_on_timeout,
+                                    match_err if cmd_auto_check else '',output_file,
+                                    delay=DateTime.convert_time(delay))
+            if summary['error'] is not None:
+                _cmd_error(cmd,summary['error'],summary)
+            BuiltIn().log("Executed command `%s` and saved output to `%s`" % (cmd,summary['file']))
+            return summary
+
         delay_time = DateTime.convert_time(delay)
 
         # only TelnetLib has set_timeout attr
         self._set_conn_timeout(channel['connection'],timeout)
         try:
-            if delay_time == 0:
+            if channel['read-mode'] == 'event':
+                wait = DateTime.convert_time(timeout or channel['timeout'])
+                output = _read_until(channel,cur_prompt,wait,error_on_timeout=True)
+            elif delay_time == 0:
                 output = channel['connection'].read_until_regexp(cur_prompt)
             else:
                 BuiltIn().log("using delay=`%s` option" % delay)
@@ -1193,17 +2206,9 @@ class VChannel(object):
 
         # result checking
         cmd_auto_check = Common.get_config_value('cmd-auto-check')
-        if cmd_auto_check and match_err != '' and re.search(match_err, output):
-            err_mat = re.search(match_err, output).group(0)
-            err_msg = (
-                "ERROR: Error encountered while execututing command - '{c}'" \
-                "\n    - {m}".format(
-                    c=cmd, m=err_mat
-                )
-            )
-            BuiltIn().log(err_msg)
-            BuiltIn().log(output)
-            raise Exception(err_msg)
+        if cmd_auto_check and match_err != '':
+            match = _get_regex(channel,match_err).search(output)
+            if match: _cmd_error(cmd,match.group(0),output)
 
         # remove PROMPT from the result if necessary
         if remove_prompt:
@@ -1214,6 +2219,67 @@ class VChannel(object):
         return output
 
 
+    def _capture(self,channel,prompt,timeout,error_on_timeout,match_err,output_file,file_mode='w',
+                delay=0,step_err=''):
+        """ Streams the output of a command that has been sent to ``channel``
+        into ``output_file`` in the current result folder until ``prompt``
+
+        When ``delay`` (in seconds) is not zero, the output is read until the
+        channel is quiet for ``delay`` like `Cmd` instead of waiting for
+        ``prompt``. ``match_err`` and ``step_err`` are searched incrementally
+        over the raw output. Returns a summary dictionary, see `Cmd` for
+        details. The match of ``step_err`` is in ``step-error`` when it is
+        defined.
+        """
+        file_path = Common.get_result_path() + '/' + output_file
+        tail_size = int(Common.get_config_value('read-tail-size','vchannel',4096))
+        err_list = [(key,_get_regex(channel,pattern,re.MULTILINE))
+                    for key,pattern in (('error',match_err),('step-error',step_err)) if pattern]
+        wait = DateTime.convert_time(timeout or channel['timeout'])
+        state = {'esc-pending':'','line':'','tail':'','error':None,'step-error':None,'size':0,'lines':0}
+
+        with codecs.open(file_path,file_mode,'utf-8') as f:
+            def _write(text):
+                f.write(text)
+                state['size'] += len(text)
+
+            def _sink(data):
+                if err_list:
+                    buf = state['tail'] + data
+                    for key,regex in err_list:
+                        if state[key] is not None: continue
+                        m = regex.search(buf)
+                        if m: state[key] = m.group(0)
+                    state['tail'] = buf[-tail_size:]
+                # only write completed lines
+                buf = state['line'] + data
+                pos = buf.rfind('\n')
+                if pos < 0:
+                    state['line'] = buf
+                    return
+                state['line'] = buf[pos+1:]
+                state['lines'] += buf.count('\n',0,pos+1)
+                _write(_filter_output(channel,buf[:pos+1],state))
+
+            try:
+                if delay:
+                    _read_until(channel,None,wait,quiet=delay,sink=_sink)
+                else:
+                    _read_until(channel,prompt,wait,error_on_timeout=True,sink=_sink)
+            except Exception:
+                if error_on_timeout: raise
+                BuiltIn().log("WARN: timeout occured but no error was raised")
+            if state['line']:
+                state['lines'] += 1
+                _write(_filter_output(channel,state['line'],state) + Common.newline)
+
+        self.log("*** output was saved to `%s` ***%s" % (output_file,Common.newline),channel)
+        BuiltIn().log("Wrote %d lines to `%s`" % (state['lines'],file_path))
+        summary = {'file':file_path,'size':state['size'],'lines':state['lines'],'error':state['error']}
+        if step_err: summary['step-error'] = state['step-error']
+        return summary
+
+
     def cmd_yesno(self,cmd,ans='yes',question='? [yes,no] ',timeout='5s'):
         """ Executes a ``cmd``, waits for ``question`` and answers that by
         ``ans``
@@ -1248,16 +2314,18 @@ class VChannel(object):
         """
         if not silence: BuiltIn().log("Read from channel buffer:")
         channel = self.get_current_channel()
-        output = ""
+        return self._feed(channel,channel['connection'].read())
 
-        # feed the data from session to the terminal stream
-        channel['stream'].feed(channel['connection'].read())
-        try:
-            # dump all the screen including its history
-            output = self._dump_screen() + Common.newline
-            channel['screen'].reset()
-        except UnicodeDecodeError as err:
-            output = err.args[1].decode('utf-8','replace')
+
+    def _feed(self,channel,data):
+        """ Feeds ``data`` read from the session to the virtual terminal
+        of ``channel``, logs and returns the output
+
+        When ``fast-read`` is enabled, the virtual terminal is only used in
+        ``screen mode``. In ``normal mode``, escape sequences are stripped from
+        ``data`` directly.
+        """
+        output = _render_output(channel,data)
         self.log(output,channel)
         return output
 
@@ -1291,15 +2359,18 @@ class VChannel(object):
         finish_cmd = channel['finish']
 
         # close
-        channels[self._current_name]['connection'].switch_connection(self._current_name)
+        channels[self._current_name]['connection'].switch_connection(channel['local-id'])
 
         # try to read once
         self.write()
 
+        # a session that goes back to the pool is kept logged in
+        keep_session = 'pool-key' in channel
+
         ### execute command before close the connection
         BuiltIn().log("Closing the connection for channel `%s`" % old_name)
         flag = Common.get_config_value('ignore-init-finish','vchannel',False)
-        if not flag and finish_cmd is not None:
+        if not flag and finish_cmd is not None and not keep_session:
             for item in finish_cmd:
                 BuiltIn().log("Execute finish command: %s" % (item))
                 channel['connection'].write_bare(item + '\r')
@@ -1310,9 +2381,10 @@ class VChannel(object):
         try:
             channel['connection'].write_bare('' + '\r')
             # time.sleep(x1)
-            output = channels[self._current_name]['connection'].close_connection()
-            if output is not None: 
-                self.log(output,channel)
+            if not keep_session:
+                output = channels[self._current_name]['connection'].close_connection()
+                if output is not None: 
+                    self.log(output,channel)
         except Exception as err:
             BuiltIn().log('WARN: ignore errors while closing channel')
             BuiltIn().log(err)
@@ -1321,8 +2393,19 @@ class VChannel(object):
         # farewell message
         finish_msg = Common.newline*2 + "%s %s %s %s" % (mark,datetime.datetime.now().strftime("%I:%M:%S%p on %B %d, %Y:"),msg,mark)
         self.log(finish_msg,channel)
-        channel['logger'].flush()
-        channel['connection'].close_all_connections()
+        # the pooled entry does not keep the logger, closing also unregisters
+        # it from the log writer
+        channel['logger'].close()
+        if 'ip' in channel: _sftp_reset(channel)
+        if keep_session:
+            entry = { key:channel[key] for key in ('connection','local-id','type','auth','finish') }
+            # a session that is not back to its original prompt will fail the
+            # health check and will not be reused
+            entry['prompt'] = channel['pool-prompt']
+            _session_pool.release(channel['pool-key'],entry)
+            BuiltIn().log("Kept the session of channel `%s` in the pool" % old_name)
+        else:
+            channel['connection'].close_all_connections()
         del(channels[self._current_name])
 
         # choose another active channel
@@ -1355,6 +2438,10 @@ class VChannel(object):
         while len(self._channels) > 0:
             self.close(msg,with_time,mark)
 
+        # make sure nothing is left in the background log writer
+        if _log_writer is not None:
+            _log_writer.drain_all()
+
         self._current_id = 0
         self._max_id = 0
         self._current_name = None
@@ -1370,7 +2457,7 @@ class VChannel(object):
             self.switch(name)
             self.read()
             if 'logger' in channel:
-                channel['logger'].flush()
+                _drain_log(channel['logger'])
 
         self.switch(current_name)
 
@@ -1389,7 +2476,7 @@ class VChannel(object):
         return  ip
 
 
-    def exec_file(self,file_name, vars='',comment='# ',step=False,mode='cmd',delay=u'0s', str_error='syntax,rror'):
+    def exec_file(self,file_name, vars='',comment='# ',step=False,mode='cmd',delay=u'0s', str_error='syntax,rror',output_file=None):
         """ Executes commands listed in ``file_name``
         Lines started with ``comment`` character is considered as comments
 
@@ -1403,6 +2490,10 @@ class VChannel(object):
         list is define by ``str_err``, that contains multi regular expression
         separated by a comma. Default value of ``str_err`` is `error`
         - `vars` are additional variables in format ``var1=value1,var2=value2``
+        - `output_file`: in `cmd` mode, streams the output of all commands to
+          this file in the current result folder instead of keeping them in
+          memory (see `Cmd`). The keyword then returns a summary dictionary of
+          the file. Errors of `step` are checked while reading.
 
         The command file could be written in Jinja2 format. Default usable
         variables are ``LOCAL`` and ``GLOBAL`` which are identical to
@@ -1421,6 +2512,7 @@ class VChannel(object):
         Examples:
         | Router.`Exec File`   | cmd.lst |
         | Router.`Exec File`   | step=${TRUE} | str_error=syntax,error |
+        | Router.`Exec File`   | cmd.lst | output_file=collect.txt |
 
 
         *Note:* Comment in the middle of the line is not supported
@@ -1434,16 +2526,20 @@ class VChannel(object):
 
         # load and evaluate jinja2 template
         folder = os.getcwd() + "/config/"
-        loader=jinja2.Environment(loader=jinja2.FileSystemLoader(folder)).get_template(file_name)
         render_var = {'LOCAL':Common.LOCAL,'GLOBAL':Common.GLOBAL}
         for pair in vars.split(','):
             info = pair.split("=")
             if len(info) == 2:
                 render_var.update({info[0].strip():info[1].strip()})
 
-        command_str = loader.render(render_var)
+        command_str = Common.render_template(file_name,render_var,folder)
+
+        if output_file and mode.lower() == 'cmd':
+            return self._exec_to_file(command_str,comment,step,str_error,output_file,delay)
 
         # execute the commands
+        channel = self.get_current_channel()
+        err_list = [_get_regex(channel,error,re.MULTILINE) for error in str_error.split(',')]
         for line in command_str.splitlines():
             if line.startswith(comment): continue
             str_cmd = line.rstrip()
@@ -1454,13 +2550,51 @@ class VChannel(object):
                 output = self.write(str_cmd)
 
             if not (step and mode.lower() == 'cmd'): continue
-            for error in str_error.split(','):
-                if re.search(error,output,re.MULTILINE):
+            for regex in err_list:
+                if regex.search(output):
                     raise Exception("Stopped because matched error after executing `%s`" % str_cmd)
 
         BuiltIn().log("Executed commands in file `%s` with mode `%s`" % (file_name,mode))
 
 
+    def _exec_to_file(self,command_str,comment,step,str_error,output_file,delay=u'0s'):
+        """ Executes commands in ``command_str`` and streams their output to
+        ``output_file``. Returns the summary of the file
+
+        Each command is checked by the default ``match_err`` of `Cmd` when
+        ``cmd-auto-check`` is enabled and waits like `Cmd` with ``delay``.
+        """
+        channel = self.get_current_channel()
+        if channel['screen_mode']:
+            raise Exception("``Cmd`` keyword is prohibitted in ``screen  mode``")
+        step_err = '|'.join('(?:%s)' % error for error in str_error.split(',')) if step else ''
+        match_err = _CMD_MATCH_ERR if Common.get_config_value('cmd-auto-check') else ''
+        delay_time = DateTime.convert_time(delay)
+        file_path = Common.get_result_path() + '/' + output_file
+        # truncate the file, the output of each command is appended later
+        codecs.open(file_path,'w','utf-8').close()
+
+        result = {'file':file_path,'size':0,'lines':0}
+        for line in command_str.splitlines():
+            if line.startswith(comment): continue
+            str_cmd = line.rstrip()
+            if str_cmd == '': continue # ignore null line
+            self.log(channel['connection'].read(),channel)
+            channel['connection'].write(str_cmd)
+            self.log(str_cmd + Common.newline,channel)
+            summary = self._capture(channel,channel['prompt'],None,True,match_err,output_file,'a',
+                                    delay=delay_time,step_err=step_err)
+            result['size']  += summary['size']
+            result['lines'] += summary['lines']
+            if summary['error'] is not None:
+                _cmd_error(str_cmd,summary['error'],summary)
+            if summary.get('step-error') is not None:
+                raise Exception("Stopped because matched error after executing `%s`" % str_cmd)
+
+        BuiltIn().log("Executed commands and saved output to `%s`" % file_path)
+        return result
+
+
     @with_reconnect
     def cmd_and_wait_for_regex(self,command,pattern,interval=u'30s',max_num=u'10',error_with_max_num=True):
         """ Execute a command and expect ``pattern`` occurs in the output.
@@ -1474,11 +2608,12 @@ class VChannel(object):
         """
 
         num = 1
+        regex = _get_regex(self.get_current_channel(),pattern)
         BuiltIn().log("Execute command `%s` and wait for `%s`" % (command,pattern))
         while num <= int(max_num):
             BuiltIn().log("    %d: command is `%s`" % (num,command))
             output = self._cmd(command)
-            if re.search(pattern,output):
+            if regex.search(output):
                 BuiltIn().log("Found pattern `%s` and stopped the loop" % pattern)
                 break;
             else:
@@ -1588,32 +2723,116 @@ class VChannel(object):
         BuiltIn().log('Write command `%s` to %d channels' % (cmd,channel_num))
 
 
-    def multi_exec_file(self,prefix,*node_list):
+    def _multi_run(self,target,node_list,timeout,fail_fast,*args):
+        """ Runs ``target`` for channels of ``node_list`` by a bounded thread
+        pool and returns the result of each node
+
+        The pool size is ``multi-worker`` in ``vchannel`` configuration.
+        ``timeout`` is the deadline for *ALL* nodes. Nodes that could not
+        finish before the deadline are marked as ``TIMEOUT`` and nodes that
+        have not started are marked as ``CANCELLED``. When ``fail_fast`` is
+        ``True``, the remained nodes are cancelled (or ``STOPPED`` at their
+        next command or read if they are running) at the first failure and an
+        error is raised. Running threads are waited for ``multi-stop-wait`` in
+        ``vchannel`` configuration before the keyword returns.
+        """
+        result = {}
+        if len(node_list) == 0: return result
+        worker = int(Common.get_config_value('multi-worker','vchannel',16))
+        wait = DateTime.convert_time(timeout) if timeout else None
+        deadline = time.time() + wait if wait else None
+        stop = threading.Event()
+        timed_out = False
+        start = time.time()
+
+        executor = ThreadPoolExecutor(max_workers=max(1,min(worker,len(node_list))))
+        futures = {}
+        for node in node_list:
+            future = executor.submit(_thread_run,target,self._channels[node],deadline,stop,*args)
+            futures[future] = node
+        try:
+            for future in as_completed(futures,timeout=wait):
+                node = futures[future]
+                result[node] = future.result()
+                if fail_fast and result[node]['status'] != 'PASS':
+                    break
+        except FutureTimeoutError:
+            timed_out = True
+            BuiltIn().log("WARN: deadline `%s` passed before all nodes finished" % timeout)
+        stop.set()
+        for future,node in futures.items():
+            if node in result: continue
+            if future.cancel():
+                status = 'CANCELLED'
+            else:
+                status = 'TIMEOUT' if timed_out else 'STOPPED'
+            result[node] = {'status':status,'output':'','error':'','time':time.time() - start}
+        # running threads stop at their next read or command, wait for them
+        # so they do not share the channels with the next keyword
+        running = {future:node for future,node in futures.items() if not future.done()}
+        if running:
+            grace = DateTime.convert_time(Common.get_config_value('multi-stop-wait','vchannel','30s'))
+            done,pending = futures_wait(list(running),timeout=grace)
+            for future in done:
+                item = future.result()
+                if item['status'] == 'PASS':
+                    result[running[future]] = item
+                else:
+                    result[running[future]]['error'] = item['error']
+            for future in pending:
+                node = running[future]
+                result[node]['error'] = "still running, the channel should not be used"
+                BuiltIn().log("WARN: thread of `%s` is still running after %s" % (node,grace))
+        executor.shutdown(wait=False)
+
+        failed = []
+        for node in node_list:
+            item = result[node]
+            BuiltIn().log("    %-20s %-9s %8.2fs %s" % (node,item['status'],item['time'],item['error']))
+            if item['status'] != 'PASS': failed.append(node)
+        if failed:
+            msg = "%d of %d nodes did not pass: %s" % (len(failed),len(node_list),','.join(failed))
+            if fail_fast:
+                BuiltIn().log("ERROR: " + msg)
+                raise Exception("ERROR: " + msg)
+            BuiltIn().log("WARN: " + msg)
+        return result
+
+
+    def multi_exec_file(self,prefix,*node_list,timeout=None,fail_fast=False):
         """ Paralelly execute command files for nodes
 
-        For each node, the execution will be executed in different thread
-        separately. The keyword will be done after *ALL* executions are finished.
+        For each node, the execution will be executed in a thread pool whose
+        size is ``multi-worker`` in ``vchannel`` configuration. The keyword
+        will be done after *ALL* executions are finished or ``timeout`` has
+        passed.
         Parameters:
         - `prefix`:  prefix of command file under local `config`
           folder. The full command filename is <prefix><node_name>.conf
         - node_list: a list of nodes that the keyword will be applied to
+        - `timeout`: deadline for all nodes. No deadline by default
+        - `fail_fast`: when ``${TRUE}``, stops other nodes at the first
+          failure and raises an error
+
+        Returns a dictionary of results by node. Each result is a dictionary
+        with following keys:
+        - ``status``: ``PASS``, ``FAIL``, ``TIMEOUT``, ``STOPPED`` or ``CANCELLED``
+        - ``output``: output of the commands
+        - ``error``: error message if the execution failed
+        - ``time``: elapsed time in seconds
 
-        *Note*: Currently, because there are no error processing for each
-        execution, the keyword is recommended for pre or post log collection only.
+        Examples:
+        | ${result}= | VChannel.`Multi Exec File` | pre_ | vmx11 | vmx12 | timeout=5m |
+        | Should Be Equal | ${result['vmx11']['status']} | PASS |
         """
-        thread_list = list()
         for node in node_list:
-            thread = threading.Thread(target=_thread_exec_file,args=(self._channels[node],prefix,''))
-            thread_list.append(thread)
             BuiltIn().log("    execute commands in `%s%s.conf` file to node `%s` in parallel" % (prefix,node,node))
-
-        # start and wait until all thread finish
-        for thread in thread_list: thread.start()
-        for thread in thread_list: thread.join()
+        result = self._multi_run(_thread_exec_file,node_list,timeout,fail_fast,prefix,'')
         BuiltIn().log("Executed command files on %d nodes" % len(node_list))
+        return result
 
 
-    def multi_exec_file_with_tag(self,prefix,*tag_list):
+    def multi_exec_file_with_tag(self,prefix,*tag_list,timeout=None,fail_fast=False):
         """ Executes command files for nodes specified by tags in background
 
         For each node, the execution will be executed in different thread
@@ -1624,30 +2843,31 @@ class VChannel(object):
           folder. The full command filename is <prefix><node_name>.conf
         - tag_list: a list of tags that the keyword will be applied to
 
-        *Note*: Currently, because there are no error processing for each
-        execution, the keyword is recommended for pre or post log collection only.
+        See `Multi Exec File` for ``timeout``, ``fail_fast`` and the result
         """
         node_list = Common.node_with_tag(*tag_list)
-        self.multi_exec_file(prefix,*node_list)
+        return self.multi_exec_file(prefix,*node_list,timeout=timeout,fail_fast=fail_fast)
 
 
-    def multi_cmd(self,cmd,*node_list):
+    def multi_cmd(self,cmd,*node_list,timeout=None,fail_fast=False):
         """ Executes a command for nodes in background
+
+        See `Multi Exec File` for ``timeout``, ``fail_fast`` and the result
+
+        Examples:
+        | ${result}= | VChannel.`Multi Cmd` | show version | vmx11 | vmx12 | timeout=30s | fail_fast=${TRUE} |
         """
-        thread_list = list()
         for node in node_list:
-            thread = threading.Thread(target=_thread_cmd,args=(self._channels[node],cmd))
-            thread_list.append(thread)
             BuiltIn().log("    execute command in `%s` on node `%s`" % (cmd,node))
-
-        # start and wait until all thread finish
-        for thread in thread_list: thread.start()
-        for thread in thread_list: thread.join()
+        result = self._multi_run(_thread_cmd,node_list,timeout,fail_fast,cmd)
         BuiltIn().log("Executed a command on %d nodes" % len(node_list))
+        return result
 
 
-    def multi_cmd_with_tag(self,cmd,*tag_list):
+    def multi_cmd_with_tag(self,cmd,*tag_list,timeout=None,fail_fast=False):
         """ Executes a command for multi nodes with tags
+
+        See `Multi Exec File` for ``timeout``, ``fail_fast`` and the result
         """
         node_list = Common.node_with_tag(*tag_list)
-        self.multi_cmd(cmd,*node_list)
+        return self.multi_cmd(cmd,*node_list,timeout=timeout,fail_fast=fail_fast)
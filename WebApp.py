@@ -14,10 +14,8 @@
 #  limitations under the License.
 
 
-import cv2,tempfile
-import pytesseract
+import tempfile
 from difflib import SequenceMatcher
-import numpy as np
 import os,time,re,traceback,shutil,sys
 from decorator import decorate
 import Common
@@ -22,6 +22,8 @@ from robot.libraries.BuiltIn import BuiltIn
 
 """
 
+_USER_LINE = re.compile(r"(\*)*\s+(\S+)\s+(\S+)")
+
 def get_version(self):
     """ return router version information
     """
@@ -39,7 +41,7 @@ def get_user(self):
         if count < 2:
             count += 1
             continue
-        m=re.match(r"(\*)*\s+(\S+)\s+(\S+)",line)
+        m=_USER_LINE.match(line)
         if m and m.group(3):
             user = m.group(3)
             if user not in result:
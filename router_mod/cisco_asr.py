@@ -18,6 +18,8 @@
 import re
 from robot.libraries.BuiltIn import BuiltIn
 
+_ROUTE_TOTAL = re.compile(r"^Total  *(\d*) ")
+
 def get_version(self):
     """ return router version information
     """
@@ -47,7 +49,7 @@ def get_route_number(self,proto='ipv4'):
     result = ""
     output = self._vchannel.cmd("show route %s summary" % proto)
     for line in output.split("\n"):
-        match = re.match(r"^Total  *(\d*) ",line)
+        match = _ROUTE_TOTAL.match(line)
         if match:
             result = int(match.group(1))
 
@@ -260,6 +260,7 @@ def get_test_report(self,report_name='result',format='csv'):
         with open(report_path,'wb') as file:
             result.raw.decode_content = True
             shutil.copyfileobj(result.raw,file)
+        if format == 'csv': Common.store_result(report_path)
 
     BuiltIn().log("Got test reports by name `%s` with format `%s`" % (report_name,format))
 
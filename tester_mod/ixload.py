@@ -145,7 +145,9 @@ def collect_data(self,prefix='',more_file='',ignore_not_found=True):
 
     tasks.put(["ixload::collect_data",prefix,more_file,ignore_not_found])
     tasks.join()
-    _check_result(results,'ixload::collect_data')
+    result = _check_result(results,'ixload::collect_data')
+    for path in result[1]:
+        if path.endswith('.csv'): Common.store_result(path)
     BuiltIn().log("Copied result data to local result folder")
 
 
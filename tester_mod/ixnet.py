@@ -33,10 +33,10 @@ import re
 import csv
 import yaml
 import time,traceback
-import pandas as pd
 import Common
-import IxNetwork
-from datetime import datetime,timedelta
+pd          = Common.LazyModule('pandas')
+np          = Common.LazyModule('numpy')
+IxNetwork   = Common.LazyModule('IxNetwork')
 from robot.libraries.BuiltIn import BuiltIn
 import robot.libraries.DateTime as DateTime
 import xml.etree.ElementTree as ET
@@ -750,6 +750,7 @@ def get_test_result(self,view,prefix=u"stat_"):
                     w.writerow(row[i][j])
 
         f.close()
+        Common.store_result(file_path)
     BuiltIn().log("Got statistic data for view `%s`" % view)
 
 
@@ -783,6 +784,52 @@ def get_all_test_result(self,prefix=u"stat_"):
     BuiltIn().log("Got all available test data")
 
 
+### flow loss calculation
+_loss_cache = {}
+
+def _parse_timestamp(series):
+    """ Converts Ixia timestamps (``H:MM:SS.ffffff``) to microseconds
+
+    Invalid or empty timestamps become ``NaN``.
+    """
+    parts = series.astype(str).str.extract(r'^\s*(\d+):(\d+):(\d+)(?:\.(\d{1,6}))?\s*$')
+    frac  = parts[3].fillna('').str.ljust(6,'0')
+    usec  = ((parts[0].astype(float)*60 + parts[1].astype(float))*60 + parts[2].astype(float))*1000000
+    return usec + pd.to_numeric(frac,errors='coerce')
+
+
+def _loss_table(file_path):
+    """ Returns the loss table of all flows in ``file_path``
+
+    The table is calculated in one pass and cached until the result file
+    changes, so calling `Loss From File` for each flow only reads the file
+    once.
+    """
+    store_file = Common._stored_view(file_path)
+    stat = os.stat(store_file or file_path)
+    stamp = (stat.st_size,stat.st_mtime_ns)
+    if file_path in _loss_cache and _loss_cache[file_path][0] == stamp:
+        return _loss_cache[file_path][1]
+
+    data = Common.read_result(file_path)
+    BuiltIn().log("    Read data from %s" % (file_path))
+    table = pd.DataFrame(index=data.index)
+    if 'Traffic Item' in data.columns: table['Traffic Item'] = data['Traffic Item']
+    table['Tx Frames']      = pd.to_numeric(data['Tx Frames'],errors='coerce')
+    table['Frames Delta']   = pd.to_numeric(data.filter(like='Frames Delta').iloc[:,0],errors='coerce')
+    first   = _parse_timestamp(data['First TimeStamp'])
+    last    = _parse_timestamp(data['Last TimeStamp'])
+    table['First Time (ms)']    = first / 1000
+    table['Last Time (ms)']     = last / 1000
+    msec_delta = (last - first) / 1000000 * 1000
+    valid   = first.notnull() & last.notnull() & (table['Tx Frames'] != 0)
+    loss    = np.trunc(table['Frames Delta'] * msec_delta / table['Tx Frames'])
+    table['Loss (ms)'] = loss.where(valid)
+
+    _loss_cache[file_path] = (stamp,table)
+    return table
+
+
 def loss_from_file(self,file_name='Flow_Statistics.csv',index='0'):
     """ Returns ``packet loss`` by miliseconds and `delta frame`.
 
@@ -797,43 +844,71 @@ def loss_from_file(self,file_name='Flow_Statistics.csv',index='0'):
 
     *Note*: The calculation should be performed when traffic is stopped.
     The calculation supposed traffic is configured by frame per second.
+    The loss of all flows is calculated when the file is read first time, use
+    `Loss Table From File` to get all of them at once.
     """
     index_int=int(index)
     result_path = os.getcwd() + '/' + Common.get_result_folder()
     file_path = result_path + '/'  + file_name
-    data = pd.read_csv(file_path,header=0)
-    # data = data[data['First TimeStamp'].notnull()] # ignore null rows
-    BuiltIn().log("    Read data from %s" % (file_path))
+    row = _loss_table(file_path).loc[index_int]
 
-    frame_delta = int(data.filter(like='Frames Delta').loc[index_int])
-    tx_frame    = int(data['Tx Frames'].loc[index_int])
-    BuiltIn().log('----------')
-    BuiltIn().log(data['First TimeStamp'].loc[index_int])
-    BuiltIn().log('----------')
-    data1 = data['First TimeStamp'].loc[index_int]
-    data2 = data['Last TimeStamp'].loc[index_int]
-    if pd.isnull(data1) or pd.isnull(data2) or tx_frame == 0:
+    frame_delta = int(row['Frames Delta'])
+    if pd.isnull(row['Loss (ms)']):
         msec_loss   = None
         BuiltIn().log("Loss was %d frames, N/A miliseconds" % (frame_delta))
     else:
-        h,res = data['First TimeStamp'].loc[index_int].split(':',1)
-        time1 = timedelta(hours=int(h)) + datetime.strptime(res,'%M:%S.%f')
-
-        h,res = data['Last TimeStamp'].loc[index_int].split(':',1)
-        time2 = timedelta(hours=int(h)) + datetime.strptime(res,'%M:%S.%f')
-
-        # time1       = datetime.strptime(data['First TimeStamp'].loc[index_int],"%H:%M:%S.%f")
-        # time2       = datetime.strptime(data['Last TimeStamp'].loc[index_int],"%H:%M:%S.%f")
-        msec_delta  = (time2-time1).total_seconds()*1000
-
-        BuiltIn().log("    Delta sec   = %d" % msec_delta)
+        BuiltIn().log("    Delta sec   = %d" % (row['Last Time (ms)'] - row['First Time (ms)']))
         BuiltIn().log("    Delta frame = %d" % frame_delta)
-        msec_loss   = int(frame_delta * msec_delta / tx_frame)
+        msec_loss   = int(row['Loss (ms)'])
         BuiltIn().log("Loss was %d frames, %d miliseconds" % (frame_delta,msec_loss))
 
     return msec_loss,frame_delta
 
 
+def loss_table_from_file(self,file_name='Flow_Statistics.csv',dst_file='loss.csv',percentile='50,90,99'):
+    """ Calculates ``packet loss`` and `delta frame` of all flows at once
+
+    The loss table is written to ``dst_file`` in the current result folder
+    with the parsed timestamps, frame delta and loss (miliseconds) of each
+    flow. Row order is the same as ``file_name``. Use ``${NULL}`` for
+    ``dst_file`` to skip writing the table.
+
+    Returns a dictionary with the number of flows (``flow``), flows that lost
+    frames (``loss_flow``), flows that the loss could not be calculated
+    (``na_flow``), ``min``, ``max``, ``mean`` of the loss and the loss at
+    each of ``percentile`` (comma separated), as ``p50``, ``p90`` ...
+
+    Samples:
+    | ${SUMMARY}= | Tester.`Loss Table From File` | Flow_Statistics.csv |
+    | Should Be True | ${SUMMARY['max']} < 50 |
+    | ${SUMMARY}= | Tester.`Loss Table From File` | dst_file=loss_01.csv | percentile=95,99.9 |
+
+    *Note*: Same as `Loss From File`, the calculation should be performed
+    when traffic is stopped.
+    """
+    result_path = os.getcwd() + '/' + Common.get_result_folder()
+    file_path = result_path + '/'  + file_name
+    table = _loss_table(file_path)
+    loss  = table['Loss (ms)'].dropna()
+
+    if dst_file:
+        table.to_csv(result_path + '/' + dst_file,index_label='Index')
+        BuiltIn().log("Wrote loss table to %s" % dst_file)
+
+    summary = {}
+    summary['flow']         = len(table)
+    summary['loss_flow']    = int((table['Frames Delta'] > 0).sum())
+    summary['na_flow']      = int(table['Loss (ms)'].isnull().sum())
+    summary['min']          = None if loss.empty else int(loss.min())
+    summary['max']          = None if loss.empty else int(loss.max())
+    summary['mean']         = None if loss.empty else float(loss.mean())
+    for item in [x.strip() for x in str(percentile).split(',') if x.strip() != '']:
+        summary['p' + item] = None if loss.empty else float(loss.quantile(float(item)/100))
+
+    BuiltIn().log("Loss of %d flows: %s" % (len(table),summary))
+    return summary
+
+
 def set_bgp_neighbor(self,*indexes,**kwargs):
     """ Enables/Disables BGP entry by neighbor index
 
@@ -1691,6 +1766,7 @@ def csv_snapshot(self,prefix='snapshot_',*views):
         result = ix.execute('copyFile',ix.readFrom(src_path,'-ixNetRelative'),ix.writeTo(dst_path,'-overwrite'))
         if result != '::ixNet::OK' :
             raise result
+        Common.store_result(dst_path)
 
     BuiltIn().log('Took snapshots of %d views' % (len(current_views)))
 
@@ -1781,6 +1857,7 @@ def get_csv_log(self, prefix='', index=u'-1', *views):
                 BuiltIn().log('copy from %s to %s' % (src_file,dst_file))
                 result = ix.execute('copyFile',ix.readFrom(src_file,'-ixNetRelative'),ix.writeTo(dst_file,'-overwrite'))
                 if result != '::ixNet::OK' : raise result
+                Common.store_result(dst_file)
                 count += 1
         else:
             csv_file = csv_list[int(index)]
@@ -1789,6 +1866,7 @@ def get_csv_log(self, prefix='', index=u'-1', *views):
             BuiltIn().log('copy from %s to %s' % (src_file,dst_file))
             result = ix.execute('copyFile',ix.readFrom(src_file,'-ixNetRelative'),ix.writeTo(dst_file,'-overwrite'))
             if result != '::ixNet::OK' : raise result
+            Common.store_result(dst_file)
             count += 1
     BuiltIn().log('Got %d CSV log files' % count)
 
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#  Copyright 2017-2020 NTT Communications
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+""" Measures the start up time of a minimal CLI-only suite
+
+The script creates a temporary item that only imports the CLI libraries
+(Common, VChannel, Logger and Router) and runs it with ``robot`` several
+times. The minimum, median and maximum time of the runs are printed.
+
+Usage:
+| $ tools/import_bench.py [-n 5] [--max 3.0] [--importtime 20]
+
+With ``--max``, the script exits with code 1 when the median time is bigger
+than the value (in seconds), so it could be used in CI to catch regressions.
+With ``--importtime``, the slowest modules imported by ``Common`` are listed.
+"""
+
+import os,sys,time
+import argparse
+import shutil
+import statistics
+import subprocess
+import tempfile
+
+SUITE = """*** Settings ***
+Library     ${RENAT_PATH}/Common.py
+Library     ${RENAT_PATH}/VChannel.py
+Library     ${RENAT_PATH}/Logger.py
+Library     ${RENAT_PATH}/Router.py
+
+*** Test Cases ***
+01. Import only
+    No Operation
+"""
+
+LOCAL = """# minimal local configuration for import benchmark
+node:
+default:
+    ignore-dead-node: yes
+"""
+
+
+def run_suite(renat_path,item_path):
+    """ Runs the suite once and returns the elapsed time
+    """
+    cmd = [sys.executable,'-m','robot','--pythonpath',renat_path,
+            '--variable','RENAT_PATH:%s' % renat_path,
+            '--output','NONE','--log','NONE','--report','NONE',
+            '--console','none','main.robot']
+    start = time.time()
+    result = subprocess.run(cmd,cwd=item_path)
+    elapsed = time.time() - start
+    if result.returncode != 0:
+        raise Exception("ERR: the benchmark suite failed with code %d" % result.returncode)
+    return elapsed
+
+
+def import_time(renat_path,item_path,top):
+    """ Prints ``top`` slowest modules imported by Common
+    """
+    cmd = [sys.executable,'-X','importtime','-c','import Common']
+    env = dict(os.environ,PYTHONPATH=renat_path)
+    result = subprocess.run(cmd,cwd=item_path,env=env,stderr=subprocess.PIPE,universal_newlines=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'): continue
+        item = line[len('import time:'):].split('|')
+        if len(item) != 3 or not item[1].strip().isdigit(): continue
+        rows.append((int(item[1]),item[2].rstrip()))
+    print("Slowest modules imported by Common (cumulative us):")
+    for cumulative,name in sorted(rows,reverse=True)[:top]:
+        print("%10d  %s" % (cumulative,name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the start up time of a minimal CLI-only suite")
+    parser.add_argument('-n','--number',type=int,default=5,help="number of runs (default 5)")
+    parser.add_argument('--max',type=float,default=None,help="fails when the median time is bigger than this (seconds)")
+    parser.add_argument('--importtime',type=int,default=0,help="lists this number of slowest modules")
+    args = parser.parse_args()
+
+    renat_path = os.environ.get('RENAT_PATH') or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.environ['RENAT_PATH'] = renat_path
+
+    item_path = tempfile.mkdtemp(prefix='renat_bench_')
+    try:
+        os.makedirs(item_path + '/config')
+        os.makedirs(item_path + '/result')
+        with open(item_path + '/main.robot','w') as f: f.write(SUITE)
+        with open(item_path + '/config/local.yaml','w') as f: f.write(LOCAL)
+
+        # the 1st run warms up the config snapshot and the bytecode
+        run_suite(renat_path,item_path)
+        times = [run_suite(renat_path,item_path) for i in range(args.number)]
+        median = statistics.median(times)
+        print("runs: %d  min: %.3fs  median: %.3fs  max: %.3fs" % (len(times),min(times),median,max(times)))
+
+        if args.importtime > 0:
+            import_time(renat_path,item_path,args.importtime)
+    finally:
+        shutil.rmtree(item_path,ignore_errors=True)
+
+    if args.max is not None and median > args.max:
+        print("ERR: median start up time %.3fs is bigger than %.3fs" % (median,args.max))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
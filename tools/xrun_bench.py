@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#  Copyright 2017-2020 NTT Communications
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+""" Measures the per-call overhead of Router.`Xrun` dispatch
+
+The script resolves a keyword (default ``get_version``) for a device type
+(default ``juniper-mx``) many times with the previous way (splitting the type
+and probing ``router_mod`` modules for each call) and with the dispatch table
+of Router, and prints the average time per call. The resolved function is
+replaced by a no-op, so only the dispatch itself is measured.
+
+Usage:
+| $ tools/xrun_bench.py [-n 100000] [--type juniper-mx] [--keyword get_version]
+"""
+
+import os,sys,re,time
+import argparse
+import shutil
+import tempfile
+from importlib import import_module
+
+LOCAL = """# minimal local configuration for xrun benchmark
+node:
+default:
+    ignore-dead-node: yes
+"""
+
+
+def old_resolve(type,cmd):
+    """ Resolves ``cmd`` like Router.`Xrun` did before the dispatch table
+    """
+    type_list = re.split(r'-|_', type)
+    type_list_length = len(type_list)
+    for i in range(0,type_list_length):
+        mod_name = '_'.join(type_list[0:type_list_length-i])
+        try:
+            mod  = import_module('router_mod.'+ mod_name)
+            if hasattr(mod,cmd):
+                break
+        except ImportError:
+            pass
+    return mod_name,getattr(mod,cmd)
+
+
+def bench(func,number):
+    """ Returns the average time (in micro seconds) of ``func`` calls
+    """
+    start = time.perf_counter()
+    for i in range(number): func()
+    return (time.perf_counter() - start) * 1000000 / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the per-call overhead of Router.Xrun dispatch")
+    parser.add_argument('-n','--number',type=int,default=100000,help="number of calls (default 100000)")
+    parser.add_argument('--type',default='juniper-mx',help="device type (default juniper-mx)")
+    parser.add_argument('--keyword',default='get_version',help="router module keyword (default get_version)")
+    args = parser.parse_args()
+
+    renat_path = os.environ.get('RENAT_PATH') or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.environ['RENAT_PATH'] = renat_path
+    sys.path.insert(0,renat_path)
+
+    item_path = tempfile.mkdtemp(prefix='renat_bench_')
+    cwd = os.getcwd()
+    try:
+        os.makedirs(item_path + '/config')
+        os.makedirs(item_path + '/result')
+        with open(item_path + '/config/local.yaml','w') as f: f.write(LOCAL)
+        os.chdir(item_path)
+
+        import Router
+        noop = lambda self: None
+
+        def old_call():
+            mod_name,func = old_resolve(args.type,args.keyword)
+            noop(None)
+
+        def new_call():
+            mod_name,func = Router._resolve_keyword(args.type,args.keyword)
+            noop(None)
+
+        mod_name,func = Router._resolve_keyword(args.type,args.keyword)
+        print("keyword `%s` of type `%s` is resolved to `router_mod.%s`" % (args.keyword,args.type,mod_name))
+        old_call()
+        old = bench(old_call,args.number)
+        new = bench(new_call,args.number)
+        print("calls: %d  old: %.3fus/call  table: %.3fus/call  (x%.1f)" % (args.number,old,new,old/new))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(item_path,ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()